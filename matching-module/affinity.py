@@ -0,0 +1,343 @@
+import logging
+import string
+from collections import Counter
+from itertools import combinations
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from artifact import StringColumn
+from product_index import ProductIndex, TERM_CACHE_SIZE, subset_columns
+
+logger = logging.getLogger(__name__)
+
+# Affinity of a product to an interest it only matches through a related
+# interest, relative to containing the interest itself
+RELATED_AFFINITY_WEIGHT = 0.5
+
+# Related interests kept per interest, strongest first
+MAX_RELATED_TERMS = 5
+
+# Profiles two interests must share before the corpus relates them, and how
+# much more often than by chance they must occur together
+MIN_COOCCURRENCE = 20
+MIN_LIFT = 2.0
+
+# Most frequent corpus terms given a row of their own
+MAX_TABLE_TERMS = 50_000
+
+# Distinct interest pairs tracked before pairs seen only once are dropped
+MAX_TRACKED_PAIRS = 2_000_000
+
+# Array names written to / read from a model artifact
+AFFINITY_ARRAYS = ('indptr', 'products', 'weights', 'related_indptr', 'related_strengths')
+AFFINITY_STRING_COLUMNS = ('terms', 'related')
+
+
+def interest_terms(text: str) -> List[str]:
+    """Terms the scorer looks up for an interests text."""
+    return [word for word in text.lower().split() if len(word) > 2]
+
+
+def relation_key(term: str) -> str:
+    """Interest a term stands for, without surrounding punctuation ("hiking," -> "hiking")."""
+    return term.strip(string.punctuation)
+
+
+def lookup_groups(lookup) -> List[Dict[str, float]]:
+    """Groups of related interests in an interest cluster or personality file.
+
+    Each top-level entry is one group: its name and every string below it,
+    as lists or nested objects. Object keys mapped to a number are terms
+    weighted by it (clipped to [0, 1]); every other term weighs 1.
+    """
+    groups = []
+    if not isinstance(lookup, dict):
+        return groups
+    for name, value in lookup.items():
+        group = {}
+        _collect_terms(name, 1.0, group)
+        _collect_terms(value, 1.0, group)
+        if len(group) > 1:
+            groups.append(group)
+    return groups
+
+
+def _collect_terms(value, weight: float, group: Dict[str, float]):
+    if isinstance(value, str):
+        for word in interest_terms(value):
+            key = relation_key(word)
+            if len(key) > 2:
+                group[key] = max(group.get(key, 0.0), weight)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, (int, float)) and not isinstance(item, bool):
+                _collect_terms(key, min(1.0, max(0.0, float(item))), group)
+            else:
+                _collect_terms(item, weight, group)
+    elif isinstance(value, list):
+        for item in value:
+            _collect_terms(item, weight, group)
+
+
+class AffinityBuilder:
+    """Collects interest statistics from the training preferences.
+
+    Profiles are added batch by batch, so the corpus is never held in
+    memory; only term and interest pair counts are kept.
+    """
+
+    def __init__(self):
+        self.profiles = 0
+        self.term_counts = Counter()
+        self.key_counts = Counter()
+        self.pair_counts = Counter()
+
+    def add_batch(self, profiles: List[Dict]):
+        for preferences in profiles:
+            if isinstance(preferences, dict) and 'preferences' in preferences:
+                preferences = preferences['preferences']
+            if not isinstance(preferences, dict):
+                continue
+            terms = interest_terms(preferences.get('interests') or '')
+            self.term_counts.update(set(terms))
+            keys = sorted({key for key in map(relation_key, terms) if len(key) > 2})
+            self.key_counts.update(keys)
+            self.pair_counts.update(combinations(keys, 2))
+        self.profiles += len(profiles)
+        if len(self.pair_counts) > MAX_TRACKED_PAIRS:
+            # A pair seen once so far is far from MIN_COOCCURRENCE
+            self.pair_counts = Counter({pair: n for pair, n in self.pair_counts.items() if n > 1})
+
+    def related_terms(self, groups: Iterable[Dict[str, float]]) -> Dict[str, List[Tuple[str, float]]]:
+        """Strongest related interests of each interest, with a strength in (0, 1].
+
+        Interests of the same lookup group are related by the lower of
+        their weights; interests the corpus puts together at least
+        ``MIN_LIFT`` times as often as chance are related by how often one
+        comes with the other.
+        """
+        strengths = {}
+
+        def relate(key, other, strength):
+            related = strengths.setdefault(key, {})
+            related[other] = max(related.get(other, 0.0), strength)
+
+        for group in groups:
+            for key, weight in group.items():
+                for other, other_weight in group.items():
+                    if other != key and min(weight, other_weight) > 0:
+                        relate(key, other, min(weight, other_weight))
+
+        for (a, b), together in self.pair_counts.items():
+            if together < MIN_COOCCURRENCE:
+                continue
+            count_a, count_b = self.key_counts[a], self.key_counts[b]
+            if together * self.profiles < MIN_LIFT * count_a * count_b:
+                continue
+            relate(a, b, together / count_a)
+            relate(b, a, together / count_b)
+
+        return {
+            key: sorted(related.items(), key=lambda item: (-item[1], item[0]))[:MAX_RELATED_TERMS]
+            for key, related in strengths.items()
+        }
+
+    def build(self, index: ProductIndex, groups: Iterable[Dict[str, float]] = (),
+              extra_terms: Iterable[str] = ()) -> 'AffinityTable':
+        """Resolve every known term against the catalog into an ``AffinityTable``."""
+        groups = list(groups)
+        related = self.related_terms(groups)
+        terms = {term for term, _ in self.term_counts.most_common(MAX_TABLE_TERMS)}
+        terms.update(extra_terms)
+        for group in groups:
+            terms.update(group)
+        terms = sorted(terms)
+
+        table = resolve_affinities(index, terms, [related.get(relation_key(term), []) for term in terms])
+        logger.info(
+            f"Built affinities for {len(terms)} interest terms from {self.profiles} profiles "
+            f"({len(table.products)} entries, {len(related)} interests with related ones)"
+        )
+        return table
+
+
+def resolve_affinities(index: ProductIndex, terms: List[str],
+                       relations: List[List[Tuple[str, float]]]) -> 'AffinityTable':
+    """Resolve terms and their related interests against the catalog.
+
+    ``relations`` holds the related interests of each term. A term's row
+    holds affinity 1 for products containing it or the interest it stands
+    for ("hiking," -> "hiking") and ``RELATED_AFFINITY_WEIGHT`` times the
+    strength of the relation for products containing only a related
+    interest. The relations are kept in the table, so it can be resolved
+    again against another catalog.
+    """
+    needed = set(terms)
+    for term, related in zip(terms, relations):
+        key = relation_key(term)
+        if len(key) > 2:
+            needed.add(key)
+        needed.update(other for other, _ in related)
+    needed = sorted(needed)
+    resolved = {}
+    for start in range(0, len(needed), TERM_CACHE_SIZE):
+        resolved.update(index.resolve_terms(needed[start:start + TERM_CACHE_SIZE]))
+
+    indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    row_products = []
+    row_weights = []
+    for row, (term, related) in enumerate(zip(terms, relations)):
+        key = relation_key(term)
+        parts = [(resolved[term], 1.0)]
+        if key != term and len(key) > 2:
+            parts.append((resolved[key], 1.0))
+        for other, strength in related:
+            parts.append((resolved[other], RELATED_AFFINITY_WEIGHT * strength))
+        products = np.concatenate([part for part, _ in parts])
+        weights = np.concatenate([np.full(len(part), weight) for part, weight in parts])
+        # Keep each product once, with its highest affinity
+        order = np.lexsort((-weights, products))
+        products, weights = products[order], weights[order]
+        first = np.ones(len(products), dtype=bool)
+        first[1:] = products[1:] != products[:-1]
+        row_products.append(products[first])
+        row_weights.append(weights[first])
+        indptr[row + 1] = indptr[row] + first.sum()
+
+    related_indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(related) for related in relations], out=related_indptr[1:])
+    return AffinityTable(
+        terms, indptr,
+        np.concatenate(row_products).astype(np.int32) if row_products else np.empty(0, dtype=np.int32),
+        np.concatenate(row_weights).astype(np.float32) if row_weights else np.empty(0, dtype=np.float32),
+        related_indptr,
+        StringColumn.from_strings([other for related in relations for other, _ in related]),
+        np.array([strength for related in relations for _, strength in related], dtype=np.float32),
+    )
+
+
+class AffinityTable:
+    """Sparse interest term -> product affinity matrix learned at training time.
+
+    Rows follow the sorted ``terms`` in CSR form (``indptr`` / ``products``
+    / ``weights``), products ascending within a row. Scoring a profile only
+    looks its terms up and adds their rows; terms the table lacks fall back
+    to the exact substring matches of the product index.
+
+    The related interests each row was resolved from are kept in the same
+    form (``related_indptr`` / ``related`` / ``related_strengths``), so
+    ``rebuild`` can carry what was learned from the corpus over to a new
+    catalog.
+    """
+
+    def __init__(self, terms, indptr: np.ndarray, products: np.ndarray, weights: np.ndarray,
+                 related_indptr: np.ndarray, related, related_strengths: np.ndarray):
+        self.terms = terms
+        self.indptr = indptr
+        self.products = products
+        self.weights = weights
+        self.related_indptr = related_indptr
+        self.related = related
+        self.related_strengths = related_strengths
+        self._rows = None
+
+    @classmethod
+    def empty(cls) -> 'AffinityTable':
+        return cls(
+            [], np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32),
+            np.zeros(1, dtype=np.int64), [], np.empty(0, dtype=np.float32),
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'AffinityTable':
+        """Rebuild a table from the arrays written by ``to_arrays``."""
+        terms, related = (
+            StringColumn(arrays[f'affinity.{name}.data'], arrays[f'affinity.{name}.offsets'])
+            for name in AFFINITY_STRING_COLUMNS
+        )
+        return cls(
+            terms, arrays['affinity.indptr'], arrays['affinity.products'], arrays['affinity.weights'],
+            arrays['affinity.related_indptr'], related, arrays['affinity.related_strengths'],
+        )
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Flat arrays describing the table, for saving in a model artifact."""
+        arrays = {f'affinity.{name}': getattr(self, name) for name in AFFINITY_ARRAYS}
+        for name in AFFINITY_STRING_COLUMNS:
+            column = getattr(self, name)
+            if not isinstance(column, StringColumn):
+                column = StringColumn.from_strings(column)
+            arrays[f'affinity.{name}.data'] = column.data
+            arrays[f'affinity.{name}.offsets'] = column.offsets
+        return arrays
+
+    def relations(self, row: int) -> List[Tuple[str, float]]:
+        """Related interests and relation strengths the row was resolved from."""
+        start, end = self.related_indptr[row], self.related_indptr[row + 1]
+        return [(self.related[i], float(self.related_strengths[i])) for i in range(start, end)]
+
+    def rebuild(self, index: ProductIndex) -> 'AffinityTable':
+        """The same terms and relations resolved against another catalog."""
+        return resolve_affinities(index, list(self.terms), [self.relations(row) for row in range(len(self))])
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_rows'] = None
+        return state
+
+    def lookup(self, terms: Iterable[str], index: ProductIndex) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Map each term to its ascending products and their affinities."""
+        if self._rows is None:
+            # Built fully before publishing, since scoring threads share the table
+            self._rows = {term: row for row, term in enumerate(self.terms)}
+        rows = {}
+        missing = []
+        for term in set(terms):
+            row = self._rows.get(term)
+            if row is None:
+                missing.append(term)
+            else:
+                start, end = self.indptr[row], self.indptr[row + 1]
+                rows[term] = (self.products[start:end], self.weights[start:end])
+        for term, products in index.resolve_terms(missing).items():
+            rows[term] = (products, np.ones(len(products), dtype=np.float32))
+        return rows
+
+    def sum_batch(self, term_lists: List[Iterable[str]], index: ProductIndex,
+                  positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Sum the affinities of each term list's terms per product.
+
+        Returns a ``len(term_lists) x size`` matrix, or one column per entry
+        of the ascending ``positions`` when only those products are scored.
+        Each distinct term is looked up once and added to every row using it.
+        """
+        columns = len(index) if positions is None else len(positions)
+        sums = np.zeros((len(term_lists), columns))
+        rows_by_term = {}
+        for row, terms in enumerate(term_lists):
+            for term in terms:
+                rows_by_term.setdefault(term, []).append(row)
+
+        rows = self.lookup(rows_by_term, index)
+        for term, term_rows in rows_by_term.items():
+            products, weights = rows[term]
+            if positions is not None:
+                columns, kept = subset_columns(positions, products)
+                products, weights = columns[kept], weights[kept]
+            if len(products) == 0:
+                continue
+            term_rows, multiplicity = np.unique(term_rows, return_counts=True)
+            sums[np.ix_(term_rows, products)] += multiplicity[:, None] * weights
+        return sums
+
+
+def row_affinity(row: Tuple[np.ndarray, np.ndarray], product: int) -> float:
+    """Affinity of one product in a row returned by ``AffinityTable.lookup``."""
+    products, weights = row
+    i = np.searchsorted(products, product)
+    if i < len(products) and products[i] == product:
+        return float(weights[i])
+    return 0.0
@@ -0,0 +1,193 @@
+import argparse
+import json
+import logging
+import os
+import time
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+from artifact import DEFAULT_ARTIFACT_DIR
+from preference_loader import sample_preferences
+
+logger = logging.getLogger(__name__)
+
+# Rows assigned to clusters per step, bounds the rows x lists matrix
+ASSIGN_CHUNK_ROWS = 65536
+
+
+class IVFIndex:
+    """Inverted-file approximate nearest-neighbour index for cosine similarity.
+
+    Vectors (L2-normalized rows, e.g. the memory-mapped product embeddings,
+    as an array or an ``EmbeddingStore``)
+    are clustered with spherical k-means. A query is compared against the
+    cluster centroids, and only the vectors in the ``n_probe`` closest
+    clusters are scored exactly.
+
+    ``n_lists`` trades build time and per-list size; ``n_probe`` trades
+    recall against latency at query time.
+    """
+
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 8,
+                 n_iter: int = 10, sample_size: int = 100_000, seed: int = 0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.sample_size = sample_size
+        self.seed = seed
+        self.centroids = None
+        self.list_ids = None
+        self.list_offsets = None
+        self.vectors = None
+
+    def build(self, vectors: np.ndarray) -> 'IVFIndex':
+        """Cluster ``vectors`` and build the inverted lists."""
+        n = len(vectors)
+        if not n:
+            raise ValueError("Cannot build an ANN index over an empty matrix")
+        rng = np.random.default_rng(self.seed)
+
+        # Spherical k-means on a sample of the vectors
+        sample_ids = np.sort(rng.choice(n, size=min(n, self.sample_size), replace=False))
+        sample = np.asarray(vectors[sample_ids], dtype=np.float32)
+        n_lists = self.n_lists or int(np.sqrt(n))
+        n_lists = max(1, min(n_lists, len(sample), 4096))
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(self.n_iter):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty clusters with random sample points
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+
+        # Assign every vector to its closest centroid
+        assignment = np.empty(n, dtype=np.int32)
+        for start in range(0, n, ASSIGN_CHUNK_ROWS):
+            chunk = np.asarray(vectors[start:start + ASSIGN_CHUNK_ROWS], dtype=np.float32)
+            assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+
+        self.centroids = centroids.astype(np.float32)
+        self.list_ids = np.argsort(assignment, kind='stable').astype(np.int32)
+        self.list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=self.list_offsets[1:])
+        self.n_lists = n_lists
+        self.vectors = vectors
+        return self
+
+    def search(self, queries: np.ndarray, k: int, n_probe: Optional[int] = None) -> List[np.ndarray]:
+        """Return, per query row, the sorted ids of up to ``k`` nearest vectors."""
+        n_probe = max(1, min(n_probe or self.n_probe, self.n_lists))
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        centroid_sims = queries @ self.centroids.T
+        if n_probe < self.n_lists:
+            probes = np.argpartition(-centroid_sims, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            probes = np.broadcast_to(np.arange(self.n_lists), centroid_sims.shape)
+
+        results = []
+        for query, lists in zip(queries, probes):
+            candidates = np.concatenate([
+                self.list_ids[self.list_offsets[l]:self.list_offsets[l + 1]] for l in lists
+            ])
+            if len(candidates) > k:
+                candidates = np.sort(candidates)
+                sims = np.asarray(self.vectors[candidates], dtype=np.float32) @ query
+                candidates = candidates[np.argpartition(-sims, k - 1)[:k]]
+            results.append(np.sort(candidates))
+        return results
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """The index as flat arrays, for saving in a model artifact."""
+        return {
+            'centroids': self.centroids,
+            'list_ids': self.list_ids,
+            'list_offsets': self.list_offsets,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], vectors: np.ndarray,
+                    n_probe: int = 8) -> 'IVFIndex':
+        """Attach saved (possibly memory-mapped) arrays to the vectors they index."""
+        index = cls(n_lists=len(arrays['centroids']), n_probe=n_probe)
+        index.centroids = arrays['centroids']
+        index.list_ids = arrays['list_ids']
+        index.list_offsets = arrays['list_offsets']
+        if int(index.list_offsets[-1]) != len(vectors):
+            raise ValueError(
+                f"ANN index covers {int(index.list_offsets[-1])} vectors, "
+                f"embeddings have {len(vectors)}"
+            )
+        index.vectors = vectors
+        return index
+
+
+def recall_report(index: IVFIndex, queries: np.ndarray, k: int = 100,
+                  n_probes: Sequence[int] = (1, 2, 4, 8, 16, 32)) -> List[Dict]:
+    """Measure recall@k and latency of the index against brute-force search."""
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    vectors = index.vectors
+
+    start = time.perf_counter()
+    sims = np.empty((len(queries), len(vectors)), dtype=np.float32)
+    for block_start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        block = np.asarray(vectors[block_start:block_start + ASSIGN_CHUNK_ROWS], dtype=np.float32)
+        sims[:, block_start:block_start + len(block)] = queries @ block.T
+    k = min(k, len(vectors))
+    exact = [set(np.argpartition(-row, k - 1)[:k].tolist()) for row in sims]
+    brute_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    report = []
+    for n_probe in n_probes:
+        if n_probe > index.n_lists:
+            break
+        start = time.perf_counter()
+        found = index.search(queries, k, n_probe=n_probe)
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = np.mean([
+            len(exact_ids & set(ids.tolist())) / max(len(exact_ids), 1)
+            for exact_ids, ids in zip(exact, found)
+        ])
+        report.append({
+            'nProbe': n_probe,
+            'recall': round(float(recall), 4),
+            'latencyMs': round(elapsed_ms, 3),
+            'bruteForceMs': round(brute_ms, 3),
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report ANN recall against brute force")
+    parser.add_argument('--model', default=DEFAULT_ARTIFACT_DIR)
+    parser.add_argument('--preferences', default='data/production_preferences.json',
+                        help="profiles to query with (.json or .jsonl, optionally .gz)")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=100)
+    args = parser.parse_args()
+
+    from model import ProductRecommender
+    model = ProductRecommender.load(args.model)
+    if model.ann_index is None:
+        raise SystemExit("Model was trained without an ANN index (set ann_candidates)")
+
+    rng = np.random.default_rng(0)
+    if os.path.exists(args.preferences):
+        preferences = sample_preferences(args.preferences, args.queries)
+        texts = [model._analyze_user_profile(profile)['semantic_text'] for profile in preferences]
+        queries = model.encoder.encode(texts)
+    else:
+        logger.info("No preference corpus found, querying with product embeddings")
+        sample = rng.choice(len(model.product_embeddings), size=args.queries)
+        queries = model.product_embeddings[sample]
+
+    print(json.dumps(recall_report(model.ann_index, queries, k=args.k), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,284 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import numpy as np
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the layout of the artifact directory changes
+ARTIFACT_SCHEMA_VERSION = 1
+
+# Directory the trained model is written to and served from
+DEFAULT_ARTIFACT_DIR = os.path.join('models', 'artifact')
+
+MANIFEST_FILE = 'manifest.json'
+
+# Replaced versions kept next to the published one, for processes that
+# still map them or were handed a pickled reference to them
+KEEP_VERSIONS = 2
+
+
+class ArtifactError(ValueError):
+    """Raised when a model artifact is missing, incomplete or incompatible."""
+
+
+def versions_path(path: str = DEFAULT_ARTIFACT_DIR) -> str:
+    """Directory holding every published version of the artifact at ``path``."""
+    return f"{path.rstrip(os.sep)}.versions"
+
+
+@contextmanager
+def artifact_lock(path: str = DEFAULT_ARTIFACT_DIR):
+    """Exclusive inter-process lock for building the artifact at ``path``.
+
+    Lets one of several workers starting together build the artifact while
+    the others wait and then map the result.
+    """
+    lock_path = f"{path.rstrip(os.sep)}.lock"
+    os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+    with open(lock_path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class StringColumn:
+    """Read-only sequence of strings stored as UTF-8 bytes plus offsets.
+
+    Both arrays can be memory-mapped, so a column costs no Python objects
+    until a string is actually read.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings: List[str]) -> 'StringColumn':
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i) -> str:
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+class ColumnarCatalog:
+    """Product catalog stored column by column.
+
+    Behaves like the list of product dicts the model was trained on;
+    each product is assembled only when it is read.
+    """
+
+    STRING_FIELDS = ('title', 'description', 'category', 'image')
+
+    def __init__(self, ids: StringColumn, prices: np.ndarray, strings: Dict[str, StringColumn]):
+        self.ids = ids
+        self.prices = prices
+        self.strings = strings
+
+    @classmethod
+    def from_products(cls, products: List[Dict]) -> 'ColumnarCatalog':
+        # Ids keep their JSON type, so 7 and "7" stay distinct
+        ids = StringColumn.from_strings([json.dumps(product.get('id')) for product in products])
+        prices = np.array([float(product.get('price', 0)) for product in products], dtype=np.float64)
+        strings = {
+            field: StringColumn.from_strings([product.get(field, '') for product in products])
+            for field in cls.STRING_FIELDS
+        }
+        return cls(ids, prices, strings)
+
+    def __len__(self):
+        return len(self.prices)
+
+    def __getitem__(self, i) -> Dict:
+        product = {'id': json.loads(self.ids[i])}
+        for field in self.STRING_FIELDS:
+            product[field] = self.strings[field][i]
+        product['price'] = float(self.prices[i])
+        return product
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {'catalog.price': self.prices}
+        columns = {'id': self.ids, **self.strings}
+        for field, column in columns.items():
+            arrays[f'catalog.{field}.data'] = column.data
+            arrays[f'catalog.{field}.offsets'] = column.offsets
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'ColumnarCatalog':
+        def column(field):
+            return StringColumn(arrays[f'catalog.{field}.data'], arrays[f'catalog.{field}.offsets'])
+        return cls(
+            column('id'),
+            arrays['catalog.price'],
+            {field: column(field) for field in cls.STRING_FIELDS},
+        )
+
+
+class ArtifactWriter:
+    """Builds a new version of an artifact and publishes it atomically.
+
+    Each version is written to its own directory under ``<path>.versions``
+    and ``path`` itself is a symlink to the current one. Publishing
+    replaces that symlink with a single rename, so ``path`` always exists
+    and readers see either the previous version or the new one in full.
+    """
+
+    def __init__(self, path: str = DEFAULT_ARTIFACT_DIR):
+        self.path = path.rstrip(os.sep)
+        self.versions_path = versions_path(self.path)
+        os.makedirs(self.versions_path, exist_ok=True)
+        self.tmp_path = tempfile.mkdtemp(prefix='.tmp-', dir=self.versions_path)
+        self.arrays = {}
+        self.files = []
+        self.manifest = None
+
+    def add_array(self, name: str, array: np.ndarray):
+        array = np.ascontiguousarray(array)
+        np.save(os.path.join(self.tmp_path, f"{name}.npy"), array)
+        self.arrays[name] = {'dtype': str(array.dtype), 'shape': list(array.shape)}
+
+    def add_json(self, name: str, value):
+        with open(os.path.join(self.tmp_path, f"{name}.json"), 'w') as f:
+            json.dump(value, f)
+        self.files.append(f"{name}.json")
+
+    def file_path(self, filename: str) -> str:
+        """Path for a file written by its own serializer."""
+        self.add_file(filename)
+        return os.path.join(self.tmp_path, filename)
+
+    def add_file(self, filename: str):
+        """Register a file the caller wrote into the artifact directory."""
+        self.files.append(filename)
+
+    def commit(self, manifest: Dict) -> str:
+        """Write the manifest, publish the version and return its directory."""
+        manifest = dict(manifest)
+        created_at = time.time()
+        manifest.update({
+            'schemaVersion': ARTIFACT_SCHEMA_VERSION,
+            'createdAt': created_at,
+            # Human-readable id of this build, reported with every response
+            'modelVersion': time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(created_at)),
+            'arrays': self.arrays,
+            'files': self.files,
+        })
+        with open(os.path.join(self.tmp_path, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        self.manifest = manifest
+
+        version = f"{manifest['modelVersion']}-{uuid.uuid4().hex[:8]}"
+        version_path = os.path.join(self.versions_path, version)
+        os.rename(self.tmp_path, version_path)
+
+        # Relative, so the models directory can be moved as a whole
+        link_path = f"{self.path}.link-{os.getpid()}"
+        if os.path.lexists(link_path):
+            os.remove(link_path)
+        os.symlink(os.path.join(os.path.basename(self.versions_path), version), link_path)
+        os.replace(link_path, self.path)
+        logger.info(f"Published model artifact {version} at {self.path}")
+
+        self._remove_old_versions(version)
+        return version_path
+
+    def _remove_old_versions(self, current: str):
+        versions = [
+            name for name in os.listdir(self.versions_path)
+            if not name.startswith('.') and name != current
+        ]
+        versions.sort(key=lambda name: os.path.getmtime(os.path.join(self.versions_path, name)))
+        for name in versions[:max(len(versions) - KEEP_VERSIONS, 0)]:
+            shutil.rmtree(os.path.join(self.versions_path, name), ignore_errors=True)
+
+    def abort(self):
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+class ArtifactReader:
+    """Validated, memory-mapped access to a saved artifact.
+
+    ``path`` is resolved once, so every file is read from the same version
+    even if a new one is published meanwhile; ``self.path`` is that version's
+    directory.
+    """
+
+    def __init__(self, path: str = DEFAULT_ARTIFACT_DIR):
+        self.path = os.path.realpath(path)
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        try:
+            with open(manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            raise ArtifactError(f"No model artifact at {path} (missing {MANIFEST_FILE})")
+        except json.JSONDecodeError as e:
+            raise ArtifactError(f"Corrupt manifest in model artifact {path}: {e}")
+
+        version = self.manifest.get('schemaVersion')
+        if version != ARTIFACT_SCHEMA_VERSION:
+            raise ArtifactError(
+                f"Model artifact {path} has schema version {version}, this code reads "
+                f"version {ARTIFACT_SCHEMA_VERSION}; retrain the model to rebuild it"
+            )
+        for filename in [f"{name}.npy" for name in self.manifest.get('arrays', {})] + self.manifest.get('files', []):
+            if not os.path.exists(os.path.join(self.path, filename)):
+                raise ArtifactError(f"Model artifact {path} is incomplete: missing {filename}")
+
+    def array(self, name: str) -> np.ndarray:
+        """Memory-map one array read-only, checking it against the manifest."""
+        expected = self.manifest['arrays'].get(name)
+        if expected is None:
+            raise ArtifactError(f"Model artifact {self.path} has no array {name}")
+        filename = os.path.join(self.path, f"{name}.npy")
+        try:
+            array = np.load(filename, mmap_mode='r')
+        except ValueError:
+            # Zero-length arrays cannot be memory-mapped
+            array = np.load(filename)
+        if str(array.dtype) != expected['dtype'] or list(array.shape) != expected['shape']:
+            raise ArtifactError(
+                f"Array {name} in model artifact {self.path} is {array.dtype}{list(array.shape)}, "
+                f"manifest says {expected['dtype']}{expected['shape']}"
+            )
+        return array
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {name: self.array(name) for name in self.manifest['arrays'] if name.startswith(prefix)}
+
+    def json(self, name: str):
+        with open(os.path.join(self.path, f"{name}.json"), 'r') as f:
+            return json.load(f)
+
+    def file_path(self, filename: str) -> Optional[str]:
+        """Path of a file stored in the artifact, or None if it has none."""
+        if filename not in self.manifest.get('files', []):
+            return None
+        return os.path.join(self.path, filename)
@@ -0,0 +1,214 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from typing import Callable, Dict, List, Optional
+
+# Run from anywhere: the matcher modules live one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from affinity import interest_terms
+from data_generator import ProductionPreferenceGenerator
+from model import ProductRecommender
+from synthetic import synthetic_catalog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (20, 10_000, 100_000, 1_000_000)
+
+# Metrics compared by --compare; all are "lower is better" except throughput
+COMPARED_METRICS = ('p50Ms', 'p95Ms', 'p99Ms', 'throughputPerSec', 'peakMemoryBytes')
+
+
+def measure(name: str, calls: List[Callable[[], object]], catalog_size: int,
+            setup: Optional[Callable[[], None]] = None) -> Dict:
+    """Time each call separately and summarize latency, throughput and memory.
+
+    ``setup`` runs before every call, outside the timed region (e.g. to
+    clear caches). Peak memory is the largest Python/NumPy heap growth
+    during any call, as seen by tracemalloc.
+    """
+    latencies = []
+    peak = 0
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for call in calls:
+            if setup is not None:
+                setup()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - start)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    latencies_ms = np.array(latencies) * 1000
+    total = float(np.sum(latencies))
+    return {
+        'benchmark': name,
+        'catalogSize': catalog_size,
+        'calls': len(latencies),
+        'meanMs': round(float(latencies_ms.mean()), 4),
+        'p50Ms': round(float(np.percentile(latencies_ms, 50)), 4),
+        'p95Ms': round(float(np.percentile(latencies_ms, 95)), 4),
+        'p99Ms': round(float(np.percentile(latencies_ms, 99)), 4),
+        'throughputPerSec': round(len(latencies) / total, 2) if total else None,
+        'peakMemoryBytes': int(peak),
+    }
+
+
+def sample_profiles(count: int, seed: int) -> List[Dict]:
+    """Preference profiles from ProductionPreferenceGenerator, reproducibly."""
+    return ProductionPreferenceGenerator(seed=seed).generate_production_preferences(count)
+
+
+def bench_catalog(size: int, profiles: List[Dict], seed: int, load_repeats: int,
+                  scoring_mode: str) -> List[Dict]:
+    """Run every benchmark against one synthetic catalog size."""
+    results = []
+    logger.info(f"Building a {size}-product catalog")
+    products = synthetic_catalog(size, seed)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        artifact_dir = os.path.join(work_dir, 'artifact')
+        model = ProductRecommender(scoring_mode=scoring_mode)
+        start = time.perf_counter()
+        model.train(products, {}, artifact_dir)
+        train_seconds = time.perf_counter() - start
+        logger.info(f"Trained on {size} products in {train_seconds:.1f}s")
+        del products, model
+        gc.collect()
+
+        results.append(measure(
+            'model_load', [lambda: ProductRecommender.load(artifact_dir)] * load_repeats, size
+        ))
+        model = ProductRecommender.load(artifact_dir)
+        model.scoring_mode = scoring_mode
+
+        results.append(measure(
+            '_analyze_user_profile',
+            [lambda p=p: model._analyze_user_profile(p) for p in profiles], size,
+        ))
+        # The few interest terms of one profile, none of them cached yet:
+        # the vocabulary search every ranking-cache miss may start with
+        term_lists = [interest_terms(p.get('interests') or '') for p in profiles]
+        results.append(measure(
+            'resolve_terms_cold',
+            [lambda terms=terms: model.product_index.resolve_terms(terms) for terms in term_lists], size,
+            setup=model.product_index._term_cache.clear,
+        ))
+        # Every call misses the ranking cache and scores the whole catalog
+        results.append(measure(
+            'get_recommendations_cold',
+            [lambda p=p: model.get_recommendations(None, p, 6) for p in profiles], size,
+            setup=model.ranking_cache.clear,
+        ))
+        # Same profiles again, now served from the ranking cache
+        for p in profiles:
+            model.get_recommendations(None, p, 6)
+        results.append(measure(
+            'get_recommendations_cached',
+            [lambda p=p: model.get_recommendations(None, p, 6) for p in profiles], size,
+        ))
+        del model
+        gc.collect()
+
+    for result in results:
+        result['trainSeconds'] = round(train_seconds, 3)
+    return results
+
+
+def environment() -> Dict:
+    """Where and on what the benchmark ran, to judge whether runs compare."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def compare(baseline: Dict, current: Dict) -> List[Dict]:
+    """Relative change of each metric between two result files."""
+    def keyed(report):
+        return {(r['benchmark'], r['catalogSize']): r for r in report['results']}
+
+    old = keyed(baseline)
+    rows = []
+    for key, new_result in keyed(current).items():
+        old_result = old.get(key)
+        if old_result is None:
+            continue
+        row = {'benchmark': key[0], 'catalogSize': key[1]}
+        for metric in COMPARED_METRICS:
+            before, after = old_result.get(metric), new_result.get(metric)
+            if before and after is not None:
+                row[metric] = f"{(after - before) / before:+.1%}"
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ProductRecommender across catalog sizes")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated catalog sizes")
+    parser.add_argument('--profiles', type=int, default=200)
+    parser.add_argument('--load-repeats', type=int, default=5)
+    parser.add_argument('--scoring-mode', default='vectorized', choices=('vectorized', 'python'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', help="baseline results JSON to diff against")
+    args = parser.parse_args()
+
+    profiles = sample_profiles(args.profiles, args.seed)
+    results = []
+    for size in (int(size) for size in args.sizes.split(',')):
+        results.extend(bench_catalog(size, profiles, args.seed, args.load_repeats, args.scoring_mode))
+
+    report = {
+        'environment': environment(),
+        'config': {
+            'sizes': args.sizes,
+            'profiles': args.profiles,
+            'scoringMode': args.scoring_mode,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        logger.info(f"Wrote results to {args.output}")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        print(json.dumps(compare(baseline, report), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
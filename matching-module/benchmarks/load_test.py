@@ -0,0 +1,320 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import httpx
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+# Run from anywhere: the matcher modules live one directory up
+MODULE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MODULE_DIR)
+
+from bench_matcher import environment, sample_profiles
+from model import ProductRecommender
+from synthetic import synthetic_catalog
+
+logger = logging.getLogger(__name__)
+
+# Page size the backend asks for (participants.service.ts)
+PAGE_SIZE = 6
+
+# Seconds to wait for every worker to load the model and the catalog
+READY_TIMEOUT = 300
+
+# Seconds between /ready probes used to spot a blocked event loop
+PROBE_INTERVAL = 0.1
+
+
+class CatalogStub:
+    """Local stand-in for the product API serving a fixed catalog.
+
+    Answers conditional requests with 304 like the real API's CDN, so the
+    service's periodic refresh costs what it does in production.
+    """
+
+    def __init__(self, products: List[Dict]):
+        body = json.dumps(products).encode('utf-8')
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/products"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def backend_request(profile: Dict) -> Dict:
+    """A generated profile shaped like the body the backend sends."""
+    return {
+        'interests': profile.get('interests') or '',
+        'sizes': {key: str(value) for key, value in profile.get('sizes', {}).items()},
+        'wishlist': profile.get('wishlist') or '',
+        'restrictions': profile.get('restrictions') or '',
+        'ageGroup': profile.get('ageGroup') or '30-49',
+        'gender': profile.get('gender') or 'Prefer not to say',
+    }
+
+
+class MatchingService:
+    """``main:app`` under uvicorn in a subprocess, configured for the run."""
+
+    def __init__(self, workers: int, env: Dict[str, str]):
+        self.workers = workers
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self._env = {**os.environ, **env}
+        self._process = None
+
+    def start(self):
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1',
+             '--port', str(self.port), '--workers', str(self.workers), '--log-level', 'warning'],
+            cwd=MODULE_DIR, env=self._env,
+        )
+        self._wait_until_ready()
+
+    def _wait_until_ready(self):
+        # Each probe opens a new connection, so with several workers the
+        # kernel spreads them out; enough consecutive 200s means all are up
+        needed = self.workers * 5
+        consecutive = 0
+        deadline = time.monotonic() + READY_TIMEOUT
+        while consecutive < needed:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"Matching service exited with {self._process.returncode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError("Matching service did not become ready in time")
+            try:
+                ready = httpx.get(f"{self.base_url}/ready", timeout=5).status_code == 200
+            except httpx.HTTPError:
+                ready = False
+            consecutive = consecutive + 1 if ready else 0
+            if not ready:
+                time.sleep(0.5)
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+
+
+async def run_load(base_url: str, participants: List[Dict], concurrency: int, duration: float,
+                   warmup: float, next_page_probability: float, max_pages: int, seed: int) -> Dict:
+    """Closed-loop load from ``concurrency`` simulated backend users.
+
+    Each user opens a random participant's recommendations and, like the
+    gift page's "load more", keeps paging with ``next_page_probability``.
+    Only requests started after ``warmup`` seconds are counted.
+    """
+    latencies = []
+    statuses = {}
+    transport_errors = 0
+    probe_latencies = []
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    limits = httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def user(index: int):
+            nonlocal transport_errors
+            rng = random.Random(seed * 100_003 + index)
+            while loop.time() < stop_at:
+                body = rng.choice(participants)
+                page = 1
+                while loop.time() < stop_at:
+                    start = loop.time()
+                    try:
+                        response = await client.post(
+                            '/match-products', params={'page': page, 'pageSize': PAGE_SIZE}, json=body
+                        )
+                        status = response.status_code
+                    except httpx.HTTPError:
+                        status = None
+                    end = loop.time()
+                    if start >= measure_from and end <= stop_at:
+                        if status is None:
+                            transport_errors += 1
+                        else:
+                            statuses[status] = statuses.get(status, 0) + 1
+                            if status == 200:
+                                latencies.append(end - start)
+                    if status != 200 or page >= max_pages or rng.random() >= next_page_probability:
+                        break
+                    page += 1
+
+        async def probe():
+            # /ready does no scoring, so its latency is the event loop's lag
+            while loop.time() < stop_at:
+                start = loop.time()
+                try:
+                    await client.get('/ready')
+                    if start >= measure_from:
+                        probe_latencies.append(loop.time() - start)
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(PROBE_INTERVAL)
+
+        await asyncio.gather(probe(), *(user(i) for i in range(concurrency)))
+
+    total = sum(statuses.values()) + transport_errors
+    latencies_ms = np.array(latencies) * 1000
+    probe_ms = np.array(probe_latencies) * 1000
+
+    def percentile(values, q):
+        return round(float(np.percentile(values, q)), 2) if len(values) else None
+
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'rps': round(total / duration, 2),
+        'successRps': round(len(latencies) / duration, 2),
+        'p50Ms': percentile(latencies_ms, 50),
+        'p95Ms': percentile(latencies_ms, 95),
+        'p99Ms': percentile(latencies_ms, 99),
+        'errorRate': round((total - len(latencies)) / total, 4) if total else None,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'transportErrors': transport_errors,
+        'probeP50Ms': percentile(probe_ms, 50),
+        'probeP99Ms': percentile(probe_ms, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the matching service against a local catalog stub")
+    parser.add_argument('--catalog-size', type=int, default=1000)
+    parser.add_argument('--workers', default='1', help="comma-separated uvicorn worker counts")
+    parser.add_argument('--concurrency', default='1,8,32', help="comma-separated concurrent users")
+    parser.add_argument('--duration', type=float, default=20.0, help="measured seconds per level")
+    parser.add_argument('--warmup', type=float, default=3.0, help="unmeasured seconds per level")
+    parser.add_argument('--participants', type=int, default=200,
+                        help="distinct preference profiles; fewer means more ranking cache hits")
+    parser.add_argument('--next-page-probability', type=float, default=0.3)
+    parser.add_argument('--max-pages', type=int, default=5)
+    parser.add_argument('--scoring-mode', default=os.environ.get('SCORING_MODE', 'thread'),
+                        choices=('inline', 'thread', 'process'))
+    parser.add_argument('--scoring-workers', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    worker_counts = [int(n) for n in args.workers.split(',')]
+    concurrency_levels = [int(n) for n in args.concurrency.split(',')]
+    participants = [backend_request(p) for p in sample_profiles(args.participants, args.seed)]
+    products = synthetic_catalog(args.catalog_size, args.seed)
+
+    stub = CatalogStub(products)
+    stub.start()
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Train up front so every run starts from the same artifact
+        artifact_dir = os.path.join(work_dir, 'artifact')
+        logger.info(f"Training on {len(products)} synthetic products")
+        ProductRecommender().train(products, {}, artifact_dir)
+        env = {
+            'PRODUCT_API_URL': stub.url,
+            'MODEL_ARTIFACT_DIR': artifact_dir,
+            'CATALOG_SNAPSHOT_DIR': os.path.join(work_dir, 'catalog'),
+            'SCORING_MODE': args.scoring_mode,
+            'SCORING_WORKERS': str(args.scoring_workers),
+            'REQUEST_LOG_SAMPLE_RATE': '0',
+        }
+        try:
+            for workers in worker_counts:
+                service = MatchingService(workers, env)
+                logger.info(f"Starting the service with {workers} worker(s)")
+                service.start()
+                try:
+                    for concurrency in concurrency_levels:
+                        result = asyncio.run(run_load(
+                            service.base_url, participants, concurrency, args.duration,
+                            args.warmup, args.next_page_probability, args.max_pages, args.seed,
+                        ))
+                        result['workers'] = workers
+                        logger.info(
+                            f"workers={workers} concurrency={concurrency}: {result['rps']} req/s, "
+                            f"p50 {result['p50Ms']}ms, p99 {result['p99Ms']}ms, "
+                            f"errors {result['errorRate'] or 0:.2%}"
+                        )
+                        results.append(result)
+                finally:
+                    service.stop()
+        finally:
+            stub.stop()
+
+    report = {
+        'environment': environment(),
+        'config': {
+            'catalogSize': args.catalog_size,
+            'participants': args.participants,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'nextPageProbability': args.next_page_probability,
+            'scoringMode': args.scoring_mode,
+            'scoringWorkers': args.scoring_workers,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        logger.info(f"Wrote results to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # One line per request would drown the summaries
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    main()
@@ -0,0 +1,50 @@
+import numpy as np
+from typing import Dict, List
+
+# Categories used by the product API
+CATEGORIES = ["men's clothing", "women's clothing", 'jewelery', 'electronics']
+
+# Words per category, mixing gender/tech indicators with the interest
+# vocabulary of ProductionPreferenceGenerator so profiles actually match
+CATEGORY_WORDS = {
+    "men's clothing": ['mens', 'jacket', 'shirt', 'cotton', 'slim', 'casual', 'hiking', 'outdoor',
+                       'fitness', 'beard', 'leather', 'wool', 'vintage', 'classic', 'sports'],
+    "women's clothing": ['womens', 'dress', 'blouse', 'rain', 'jacket', 'floral', 'ladies',
+                         'fashion', 'summer', 'winter', 'yoga', 'running', 'boho', 'silk'],
+    'jewelery': ['gold', 'silver', 'ring', 'bracelet', 'necklace', 'princess', 'rose', 'plated',
+                 'diamond', 'pendant', 'earrings', 'cute', 'handmade', 'vintage'],
+    'electronics': ['ssd', 'drive', 'gaming', 'monitor', 'usb', 'storage', 'digital', 'computer',
+                    'wireless', 'portable', 'tech', 'smart', 'home', 'photography', 'camera'],
+}
+COMMON_WORDS = ['premium', 'gift', 'set', 'new', 'eco', 'sustainable', 'travel', 'cooking',
+                'gardening', 'reading', 'music', 'crafts', 'art', 'wellness', 'photography',
+                'technology', 'outdoor', 'decoration', 'collection', 'edition']
+
+
+def synthetic_catalog(size: int, seed: int = 0) -> List[Dict]:
+    """Return ``size`` products in the format DataFetcher produces.
+
+    The same ``(size, seed)`` always yields the same catalog. A small
+    share of made-up words per product keeps the vocabulary growing with
+    the catalog like a real one does.
+    """
+    rng = np.random.default_rng(seed)
+    category_ids = rng.integers(0, len(CATEGORIES), size=size)
+    prices = np.round(rng.uniform(1.0, 500.0, size=size), 2)
+    products = []
+    for i in range(size):
+        category = CATEGORIES[category_ids[i]]
+        words = CATEGORY_WORDS[category]
+        title_words = [words[j] for j in rng.integers(0, len(words), size=4)]
+        description_words = [words[j] for j in rng.integers(0, len(words), size=8)]
+        description_words += [COMMON_WORDS[j] for j in rng.integers(0, len(COMMON_WORDS), size=6)]
+        description_words.append(f"model{rng.integers(0, max(size // 4, 1))}")
+        products.append({
+            'id': i + 1,
+            'title': ' '.join(title_words).title(),
+            'description': ' '.join(description_words).capitalize() + '.',
+            'price': float(prices[i]),
+            'category': category,
+            'image': f"https://example.com/img/{i + 1}.jpg",
+        })
+    return products
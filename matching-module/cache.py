@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import numpy as np
+
+
+class RankedEntry:
+    """Cached ranking for one profile: a prefix of ranked catalog positions.
+
+    ``ranking`` holds catalog positions in ranking order and ``scores`` their
+    final scores. ``complete`` is set when the prefix spans the whole catalog.
+    """
+
+    __slots__ = ('profile', 'ranking', 'scores', 'complete')
+
+    def __init__(self, profile: Dict, ranking: np.ndarray, scores: np.ndarray, complete: bool):
+        self.profile = profile
+        self.ranking = ranking
+        self.scores = scores
+        self.complete = complete
+
+    def covers(self, end: int) -> bool:
+        """Whether positions up to ``end`` can be served from this entry."""
+        return self.complete or end <= len(self.ranking)
+
+
+class RankingCache:
+    """Thread-safe LRU cache with a per-entry time to live.
+
+    Keeps hit, miss, eviction and expiration counters so the cache can be
+    sized from production traffic.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, accept: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        """Return the cached value for ``key`` or None if absent or expired.
+
+        If ``accept`` is given, a cached value it rejects counts as a miss.
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if accept is not None and not accept(value):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Store ``value`` under ``key``, evicting the least recently used entry."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the catalog or model changed."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        """Return cache counters and occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+            }
@@ -1,42 +1,301 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import httpx
 import requests
 import logging
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_PRODUCT_API_URL = 'https://fakestoreapi.com/products'
+DEFAULT_SNAPSHOT_DIR = os.path.join('data', 'catalog')
+SNAPSHOT_FILE = 'snapshot.json'
+
+
+def catalog_version(products: List[Dict]) -> str:
+    """Content hash of a catalog, identical across worker processes.
+
+    Both the fetched catalog and the model trained on it report this, so
+    equal versions mean the model is in sync with the catalog.
+    """
+    payload = json.dumps(products, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+
+class CatalogSnapshot:
+    """One version of the product catalog plus its HTTP validators."""
+
+    def __init__(self, products: List[Dict], etag: Optional[str] = None,
+                 last_modified: Optional[str] = None, fetched_at: float = 0.0,
+                 version: Optional[str] = None):
+        self.products = products
+        self.version = version or catalog_version(products)
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    def to_dict(self) -> Dict:
+        return {
+            'version': self.version,
+            'etag': self.etag,
+            'lastModified': self.last_modified,
+            'fetchedAt': self.fetched_at,
+            'products': self.products,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'CatalogSnapshot':
+        # The version is recomputed, so it always matches the products
+        return cls(
+            products=data['products'],
+            etag=data.get('etag'),
+            last_modified=data.get('lastModified'),
+            fetched_at=float(data.get('fetchedAt', 0.0)),
+        )
+
+
 class DataFetcher:
-    def __init__(self):
-        self.product_api_url = 'https://fakestoreapi.com/products'
-    
+    """Product catalog backed by an in-memory copy and an on-disk snapshot.
+
+    ``get_products`` serves the in-memory catalog and only goes to the
+    upstream API when it is older than ``refresh_interval`` seconds, using
+    a conditional request (ETag / Last-Modified) so an unchanged catalog
+    costs a 304. If the upstream fails, the last good snapshot keeps being
+    served and the next attempt is delayed by ``retry_interval``.
+    """
+
+    def __init__(self, product_api_url: Optional[str] = None, snapshot_dir: Optional[str] = None,
+                 refresh_interval: Optional[float] = None, retry_interval: float = 30.0,
+                 timeout: float = 10.0):
+        self.product_api_url = product_api_url or os.environ.get('PRODUCT_API_URL', DEFAULT_PRODUCT_API_URL)
+        self.snapshot_dir = snapshot_dir or os.environ.get('CATALOG_SNAPSHOT_DIR', DEFAULT_SNAPSHOT_DIR)
+        if refresh_interval is None:
+            refresh_interval = float(os.environ.get('CATALOG_REFRESH_INTERVAL', '300'))
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._snapshot = None
+        self._next_refresh_at = 0.0
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.snapshot_dir, SNAPSHOT_FILE)
+
+    @property
+    def catalog_version(self) -> Optional[str]:
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else None
+
     def get_products(self) -> List[Dict]:
-        """Fetch products from the API."""
+        """Return the current catalog, refreshing it first if it is due."""
+        if self._snapshot is None:
+            self._snapshot = self._load_snapshot()
+            if self._snapshot is not None:
+                self._next_refresh_at = self._snapshot.fetched_at + self.refresh_interval
+        if time.time() >= self._next_refresh_at:
+            self.refresh()
+        snapshot = self._snapshot
+        return snapshot.products if snapshot else []
+
+    def refresh(self, force: bool = False) -> Optional[CatalogSnapshot]:
+        """Revalidate the catalog against the upstream API.
+
+        Returns the snapshot being served afterwards. Concurrent callers do
+        not queue up behind a slow refresh; they keep the current snapshot.
+        """
+        if not self._refresh_lock.acquire(blocking=self._snapshot is None):
+            return self._snapshot
         try:
-            response = requests.get(self.product_api_url)
-            response.raise_for_status()
-            raw_products = response.json()
-            
-            # Log the first product to see its structure
-            if raw_products:
-                logger.info(f"Sample product from API: {raw_products[0]}")
-            
-            # Transform products into our expected format
-            transformed_products = []
-            for product in raw_products:
-                transformed_product = {
-                    'id': product.get('id', hash(product.get('title', ''))),  # Fallback to hash of title
-                    'title': product.get('title', ''),
-                    'description': product.get('description', ''),
-                    'price': float(product.get('price', 0)),
-                    'category': product.get('category', '').lower(),
-                    'image': product.get('image', '')
-                }
-                transformed_products.append(transformed_product)
-            
-            logger.info(f"Transformed {len(transformed_products)} products")
-            if transformed_products:
-                logger.info(f"Sample transformed product: {transformed_products[0]}")
-            
-            return transformed_products
+            current = self._snapshot
+            if not force and current is not None and time.time() < self._next_refresh_at:
+                # Another caller refreshed while we waited
+                return current
+            headers = self._conditional_headers(current)
+            response = self.session.get(self.product_api_url, headers=headers, timeout=self.timeout)
+            self._apply_response(current, response.status_code, response.headers, response.content)
         except Exception as e:
             logger.error(f"Error fetching products: {e}")
-            return []
+            if self._snapshot is not None:
+                logger.warning(f"Serving stale catalog version {self._snapshot.version}")
+            self._next_refresh_at = time.time() + self.retry_interval
+        finally:
+            self._refresh_lock.release()
+        return self._snapshot
+
+    def _conditional_headers(self, current: Optional[CatalogSnapshot]) -> Dict[str, str]:
+        """Validators that let the upstream answer 304 for an unchanged catalog."""
+        headers = {}
+        if current is not None:
+            if current.etag:
+                headers['If-None-Match'] = current.etag
+            if current.last_modified:
+                headers['If-Modified-Since'] = current.last_modified
+        return headers
+
+    def _apply_response(self, current: Optional[CatalogSnapshot], status_code: int,
+                        headers, content: bytes):
+        """Turn an upstream response into the snapshot being served."""
+        now = time.time()
+        if status_code == 304 and current is not None:
+            logger.info(f"Catalog version {current.version} not modified")
+            snapshot = CatalogSnapshot(
+                current.products,
+                headers.get('ETag', current.etag),
+                headers.get('Last-Modified', current.last_modified),
+                now,
+                current.version,
+            )
+        else:
+            if not 200 <= status_code < 300:
+                raise requests.HTTPError(f"Upstream returned HTTP {status_code}")
+            raw_products = json.loads(content)
+            if not isinstance(raw_products, list):
+                raise ValueError("Upstream catalog is not a list of products")
+            products = self._transform_products(raw_products)
+            if not products and current is not None:
+                raise ValueError("Upstream returned an empty catalog")
+            snapshot = CatalogSnapshot(products, headers.get('ETag'), headers.get('Last-Modified'), now)
+            if current is None or snapshot.version != current.version:
+                logger.info(f"Fetched catalog version {snapshot.version} with {len(products)} products")
+            self._save_snapshot(snapshot)
+
+        self._snapshot = snapshot
+        self._next_refresh_at = now + self.refresh_interval
+
+    def _transform_products(self, raw_products: List[Dict]) -> List[Dict]:
+        """Transform API products into our expected format."""
+        # Log the first product to see its structure
+        if raw_products:
+            logger.debug(f"Sample product from API: {raw_products[0]}")
+
+        transformed_products = []
+        for product in raw_products:
+            transformed_product = {
+                'id': product.get('id', hash(product.get('title', ''))),  # Fallback to hash of title
+                'title': product.get('title', ''),
+                'description': product.get('description', ''),
+                'price': float(product.get('price', 0)),
+                'category': product.get('category', '').lower(),
+                'image': product.get('image', '')
+            }
+            transformed_products.append(transformed_product)
+
+        logger.info(f"Transformed {len(transformed_products)} products")
+        return transformed_products
+
+    def _load_snapshot(self) -> Optional[CatalogSnapshot]:
+        """Read the on-disk snapshot, if there is a usable one."""
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                snapshot = CatalogSnapshot.from_dict(json.load(f))
+            logger.info(f"Loaded catalog snapshot version {snapshot.version} "
+                        f"with {len(snapshot.products)} products")
+            return snapshot
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable catalog snapshot {self.snapshot_path}: {e}")
+            return None
+
+    def _save_snapshot(self, snapshot: CatalogSnapshot):
+        """Atomically replace the on-disk snapshot."""
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot.to_dict(), f)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            logger.warning(f"Could not write catalog snapshot: {e}")
+
+
+class AsyncDataFetcher(DataFetcher):
+    """Catalog refreshed by a background task over a pooled async client.
+
+    ``start`` loads the on-disk snapshot and launches a task that
+    revalidates it every ``refresh_interval`` seconds over a keep-alive
+    ``httpx.AsyncClient``; startup itself never waits on the network.
+    ``get_products`` never does I/O: it returns whatever snapshot the task
+    last swapped in, so a slow upstream never stalls request handlers.
+    ``transport`` replaces the client's network transport, e.g. with an
+    ``httpx.MockTransport``.
+    """
+
+    def __init__(self, *args, max_connections: int = 4,
+                 transport: Optional[httpx.AsyncBaseTransport] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_connections = max_connections
+        self.transport = transport
+        self.client = None
+        self._task = None
+        self._async_lock = None
+
+    async def start(self):
+        """Open the client, load the disk snapshot and start refreshing."""
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+            transport=self.transport,
+        )
+        self._async_lock = asyncio.Lock()
+        self._snapshot = await asyncio.to_thread(self._load_snapshot)
+        if self._snapshot is not None:
+            self._next_refresh_at = self._snapshot.fetched_at + self.refresh_interval
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """Cancel the refresh task and close pooled connections."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def get_products(self) -> List[Dict]:
+        """Return the catalog snapshot currently being served."""
+        snapshot = self._snapshot
+        return snapshot.products if snapshot else []
+
+    async def refresh(self, force: bool = False) -> Optional[CatalogSnapshot]:
+        """Revalidate the catalog against the upstream API."""
+        async with self._async_lock:
+            current = self._snapshot
+            if not force and current is not None and time.time() < self._next_refresh_at:
+                return current
+            try:
+                response = await self.client.get(
+                    self.product_api_url, headers=self._conditional_headers(current)
+                )
+                # Parsing and the snapshot write happen off the event loop;
+                # the new snapshot is swapped in with a single assignment
+                await asyncio.to_thread(
+                    self._apply_response, current, response.status_code,
+                    response.headers, response.content
+                )
+            except Exception as e:
+                logger.error(f"Error fetching products: {e}")
+                if self._snapshot is not None:
+                    logger.warning(f"Serving stale catalog version {self._snapshot.version}")
+                self._next_refresh_at = time.time() + self.retry_interval
+        return self._snapshot
+
+    async def _refresh_loop(self):
+        while True:
+            delay = self._next_refresh_at - time.time()
+            if delay > 0:
+                await asyncio.sleep(max(delay, 1.0))
+            await self.refresh()
@@ -1,10 +1,29 @@
+import argparse
+import gzip
+import hashlib
+import io
 import json
+import os
 import random
-from typing import List, Dict, Tuple
+import shutil
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from itertools import combinations
 
+# Optional preferences added to some profiles by _add_profile_variations
+SEASONAL_PREFERENCES = ['winter', 'spring', 'summer', 'fall']
+BRAND_PREFERENCES = ['luxury', 'mainstream', 'boutique', 'sustainable']
+SHOPPING_STYLES = ['online', 'in-store', 'both', 'research-first']
+
 class ProductionPreferenceGenerator:
-    def __init__(self):
+    def __init__(self, seed=None):
+        # Seeded generators are reproducible; unseeded ones share the
+        # global random state as before
+        self.rng = random.Random(seed) if seed is not None else random
+        
         # Initialize base attributes first
         self.clothing_sizes = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
         self.shoe_sizes = ['36', '37', '38', '39', '40', '41', '42', '43', '44', '45']
@@ -190,29 +209,55 @@ class ProductionPreferenceGenerator:
         ])
     
     def generate_production_preferences(self, num_profiles: int) -> List[Dict]:
-        profiles = []
-        
+        return list(self.iter_production_preferences(num_profiles))
+    
+    def iter_production_preferences(self, num_profiles: int, shuffle: bool = True) -> Iterator[Dict]:
+        """Yield ``num_profiles`` profiles one at a time.
+        
+        With ``shuffle`` the demographic buckets are interleaved in random
+        order instead of generated one after another. Profiles within a
+        bucket are independent draws, so this is equivalent to shuffling
+        the whole list while only the bucket counts are held in memory.
+        """
         # Calculate distribution based on market research
         distribution = self._calculate_demographic_distribution(num_profiles)
         
-        for demographic, count in distribution.items():
-            age_group, region, season = demographic
-            
-            for _ in range(count):
-                # Generate base profile
-                profile = self._generate_demographic_profile(age_group, region, season)
-                
-                # Add variations and noise
-                profile = self._add_profile_variations(profile)
-                
-                # Validate and clean profile
-                profile = self._validate_profile(profile)
-                
-                profiles.append(profile)
-        
-        # Shuffle profiles to avoid demographic clustering
-        random.shuffle(profiles)
-        return profiles
+        if shuffle:
+            demographics = interleave(distribution, self.rng)
+        else:
+            demographics = (
+                demographic
+                for demographic, count in distribution.items()
+                for _ in range(count)
+            )
+        
+        for age_group, region, season in demographics:
+            yield self._generate_profile(age_group, region, season)
+    
+    def _generate_profile(self, age_group: str, region: str, season: str) -> Dict:
+        # Generate base profile
+        profile = self._generate_demographic_profile(age_group, region, season)
+        
+        # Add variations and noise
+        profile = self._add_profile_variations(profile)
+        
+        # Validate and clean profile
+        return self._validate_profile(profile)
+    
+    def iter_bucket(self, age_group: str, region: str, season: str, count: int) -> Iterator[Dict]:
+        """Yield ``count`` profiles of one demographic bucket."""
+        for _ in range(count):
+            yield self._generate_profile(age_group, region, season)
+    
+    def iter_json_lines(self, num_profiles: int, shuffle: bool = True) -> Iterator[str]:
+        """Like ``iter_production_preferences``, as compact JSON strings."""
+        for profile in self.iter_production_preferences(num_profiles, shuffle):
+            yield json.dumps(profile, separators=(',', ':'))
+    
+    def iter_bucket_lines(self, age_group: str, region: str, season: str, count: int) -> Iterator[str]:
+        """Like ``iter_bucket``, as compact JSON strings."""
+        for profile in self.iter_bucket(age_group, region, season, count):
+            yield json.dumps(profile, separators=(',', ':'))
     
     def _calculate_demographic_distribution(self, num_profiles: int) -> Dict[Tuple, int]:
         # Calculate realistic distribution based on market research
@@ -255,7 +300,7 @@ class ProductionPreferenceGenerator:
     def _select_demographic_appropriate_persona(self, age_group: str, region: str) -> str:
         # Weight persona selection based on demographics
         weighted_personas = self._get_weighted_personas(age_group, region)
-        return random.choices(
+        return self.rng.choices(
             list(weighted_personas.keys()),
             weights=list(weighted_personas.values())
         )[0]
@@ -303,7 +348,7 @@ class ProductionPreferenceGenerator:
     
     def _generate_base_profile(self, persona: str) -> Dict:
         # Select random subcategory based on weights
-        subcategory = random.choices(
+        subcategory = self.rng.choices(
             list(self.persona_categories[persona].keys()),
             weights=list(self.persona_categories[persona].values())
         )[0]
@@ -312,31 +357,31 @@ class ProductionPreferenceGenerator:
         interests = self.interests_by_persona[persona][subcategory]
         
         # Select random color style and colors
-        color_style = random.choice(list(self.colors_by_style.keys()))
+        color_style = self.rng.choice(list(self.colors_by_style.keys()))
         if isinstance(self.colors_by_style[color_style], dict):
             # Handle seasonal colors
-            season = random.choice(list(self.colors_by_style[color_style].keys()))
+            season = self.rng.choice(list(self.colors_by_style[color_style].keys()))
             colors = self.colors_by_style[color_style][season]
         else:
             colors = self.colors_by_style[color_style]
         
         return {
-            'interests': ', '.join(random.sample(interests, min(4, len(interests)))),
+            'interests': ', '.join(self.rng.sample(interests, min(4, len(interests)))),
             'sizes': {
-                'clothing': random.choice(self.clothing_sizes),
-                'shoe': random.choice(self.shoe_sizes),
-                'ring': random.choice(self.ring_sizes)
+                'clothing': self.rng.choice(self.clothing_sizes),
+                'shoe': self.rng.choice(self.shoe_sizes),
+                'ring': self.rng.choice(self.ring_sizes)
             },
-            'restrictions': ', '.join(random.sample(self.common_restrictions, random.randint(0, 2))),
-            'ageGroup': random.choice(self.age_groups),
-            'gender': random.choice(self.genders),
+            'restrictions': ', '.join(self.rng.sample(self.common_restrictions, self.rng.randint(0, 2))),
+            'ageGroup': self.rng.choice(self.age_groups),
+            'gender': self.rng.choice(self.genders),
         }
     
     def _add_demographic_variations(
         self, profile: Dict, age_group: str, region: str, season: str
     ) -> Dict:
         # Add interests from seasonal variations
-        seasonal_interests = random.sample(self.seasonal_interests[season], 2)
+        seasonal_interests = self.rng.sample(self.seasonal_interests[season], 2)
         profile['interests'] = self._combine_interests(
             profile['interests'], ', '.join(seasonal_interests)
         )
@@ -345,38 +390,32 @@ class ProductionPreferenceGenerator:
         regional_boosts = self.regional_preferences[region]['interests_boost']
         profile['interests'] = self._combine_interests(
             profile['interests'], 
-            ', '.join(random.sample(regional_boosts, 1))
+            ', '.join(self.rng.sample(regional_boosts, 1))
         )
         
         # Modify style preferences based on region
-        if random.random() < 0.3:  # 30% chance to use regional style
-            profile['stylePreference'] = random.choice(
+        if self.rng.random() < 0.3:  # 30% chance to use regional style
+            profile['stylePreference'] = self.rng.choice(
                 self.regional_preferences[region]['style_boost']
             )
         
         return profile
     
     def _combine_interests(self, existing_interests: str, new_interests: str) -> str:
-        # Combine interests while avoiding duplicates
-        all_interests = set(existing_interests.split(', ') + new_interests.split(', '))
-        return ', '.join(list(all_interests))
+        # Combine interests while avoiding duplicates, in a stable order
+        all_interests = dict.fromkeys(existing_interests.split(', ') + new_interests.split(', '))
+        return ', '.join(all_interests)
     
     def _add_profile_variations(self, profile: Dict) -> Dict:
         # Add random variations to make profiles more unique
-        if random.random() < 0.3:
-            profile['seasonalPreference'] = random.choice(
-                ['winter', 'spring', 'summer', 'fall']
-            )
+        if self.rng.random() < 0.3:
+            profile['seasonalPreference'] = self.rng.choice(SEASONAL_PREFERENCES)
         
-        if random.random() < 0.4:
-            profile['brandPreference'] = random.choice(
-                ['luxury', 'mainstream', 'boutique', 'sustainable']
-            )
+        if self.rng.random() < 0.4:
+            profile['brandPreference'] = self.rng.choice(BRAND_PREFERENCES)
         
-        if random.random() < 0.25:
-            profile['shoppingStyle'] = random.choice(
-                ['online', 'in-store', 'both', 'research-first']
-            )
+        if self.rng.random() < 0.25:
+            profile['shoppingStyle'] = self.rng.choice(SHOPPING_STYLES)
         
         return profile
     
@@ -406,21 +445,495 @@ class ProductionPreferenceGenerator:
             
             # Add some boosted interests
             boost_interests = self.age_appropriate_interests[age_group]['boost']
-            interest_list.extend(random.sample(boost_interests, 1))
+            interest_list.extend(self.rng.sample(boost_interests, 1))
             
-            return ', '.join(set(interest_list))
+            return ', '.join(dict.fromkeys(interest_list))
         
         return interests
 
-def generate_production_data(num_profiles: int, output_file: str):
-    generator = ProductionPreferenceGenerator()
-    preferences = generator.generate_production_preferences(num_profiles)
+# Profiles drawn per vectorized batch, bounding BatchPreferenceGenerator's memory
+BATCH_SIZE = 50000
+
+def numpy_seed(seed) -> Optional[int]:
+    """NumPy seed for ``seed``, which may also be a string like the shard seeds."""
+    if seed is None or isinstance(seed, int):
+        return seed
+    return int.from_bytes(hashlib.sha256(str(seed).encode('utf-8')).digest()[:8], 'little')
+
+def _sample_rows(rng: np.random.Generator, rows: int, population: int, k: int) -> np.ndarray:
+    """``rows`` ordered samples of ``k`` distinct indices below ``population``."""
+    return np.argsort(rng.random((rows, population)), axis=1)[:, :k]
+
+def _strings(values) -> np.ndarray:
+    """Object array of Python strings, for vectorized lookups and concatenation."""
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+# Keys _add_demographic_variations and _add_profile_variations may add, in order
+OPTIONAL_KEYS = ('stylePreference', 'seasonalPreference', 'brandPreference', 'shoppingStyle')
+
+def _optional(mask: np.ndarray, choices: np.ndarray) -> np.ndarray:
+    """``choices`` where ``mask`` is set and -1 elsewhere."""
+    return np.where(mask, choices, -1)
+
+class BatchPreferenceGenerator(ProductionPreferenceGenerator):
+    """Vectorized generator drawing whole columns of a bucket at once.
+    
+    Every random choice of the per-profile generator is drawn for a whole
+    batch with one NumPy call, from categorical tables built once. Interest
+    de-duplication and the age filter work on a matrix of interest ids, and
+    even the JSON lines are concatenated column-wise, so little is left to
+    do per profile. The profiles follow the same distributions as
+    ``ProductionPreferenceGenerator``, though not the same sequence for a
+    given seed.
+    """
+    
+    def __init__(self, seed=None):
+        super().__init__(seed)
+        self.np_rng = np.random.default_rng(numpy_seed(seed))
+        self._build_tables()
     
-    with open(output_file, 'w') as f:
-        json.dump(preferences, f, indent=2)
+    def _build_tables(self):
+        vocabulary = {}
+        
+        def interest_ids(interests):
+            return np.array([vocabulary.setdefault(interest, len(vocabulary)) for interest in interests])
+        
+        self.personas = list(self.persona_categories)
+        self.persona_weights = {
+            (age_group, region): np.array(
+                [self._get_weighted_personas(age_group, region)[persona] for persona in self.personas]
+            )
+            for age_group in self.age_groups
+            for region in self.regional_preferences
+        }
+        self.subcategory_tables = []
+        for persona in self.personas:
+            weights = np.array(list(self.persona_categories[persona].values()))
+            interests = [
+                interest_ids(self.interests_by_persona[persona][subcategory])
+                for subcategory in self.persona_categories[persona]
+            ]
+            self.subcategory_tables.append((weights / weights.sum(), interests))
+        self.seasonal_ids = {
+            season: interest_ids(interests) for season, interests in self.seasonal_interests.items()
+        }
+        self.regional_ids = {
+            region: interest_ids(preferences['interests_boost'])
+            for region, preferences in self.regional_preferences.items()
+        }
+        
+        # Age groups without an entry keep their interests and get no boost
+        self.age_boost_ids = []
+        for age_group in self.age_groups:
+            boosts = self.age_appropriate_interests.get(age_group, {}).get('boost', [])
+            self.age_boost_ids.append(interest_ids(boosts) if boosts else np.array([-1]))
+        self.age_reduced = np.zeros((len(self.age_groups), len(vocabulary) + 1), dtype=bool)
+        for age, age_group in enumerate(self.age_groups):
+            for interest in self.age_appropriate_interests.get(age_group, {}).get('reduce', []):
+                if interest in vocabulary:
+                    self.age_reduced[age, vocabulary[interest]] = True
+        
+        interests = list(vocabulary)
+        self.interest_names = _strings(interests)
+        self.interest_separated = _strings([', ' + interest for interest in interests])
+        self.interest_json = _strings([json.dumps(interest)[1:-1] for interest in interests])
+        self.interest_json_separated = _strings([', ' + encoded for encoded in self.interest_json])
+        
+        # Every restrictions string: none, one, or an ordered pair
+        restrictions = self.common_restrictions
+        restriction_strings = [''] + restrictions + [
+            ', '.join((first, second)) for first in restrictions for second in restrictions
+        ]
+        
+        # Values of the other fields by index, as-is and JSON-encoded; the
+        # optional fields' encodings carry their key and are empty at -1
+        self.value_tables = {}
+        for key, values in (('clothing', self.clothing_sizes), ('shoe', self.shoe_sizes),
+                            ('ring', self.ring_sizes), ('restrictions', restriction_strings),
+                            ('ageGroup', self.age_groups), ('gender', self.genders)):
+            self.value_tables[key] = (_strings(values), _strings([json.dumps(value) for value in values]))
+        for key, values in (('seasonalPreference', SEASONAL_PREFERENCES),
+                            ('brandPreference', BRAND_PREFERENCES),
+                            ('shoppingStyle', SHOPPING_STYLES)):
+            self.value_tables[key] = self._optional_table(key, values)
+        self.style_tables = {
+            region: self._optional_table('stylePreference', preferences['style_boost'])
+            for region, preferences in self.regional_preferences.items()
+        }
+    
+    @staticmethod
+    def _optional_table(key: str, values: List[str]):
+        # Index -1 picks the trailing None / empty entry
+        return (
+            _strings(values + [None]),
+            _strings([f',{json.dumps(key)}:{json.dumps(value)}' for value in values] + ['']),
+        )
+    
+    def _draw_bucket(self, age_group: str, region: str, season: str, count: int) -> Dict[str, np.ndarray]:
+        """Draw the columns of ``count`` profiles of one demographic bucket."""
+        rng = self.np_rng
+        
+        # Interest ids: four from the persona's subcategory, two seasonal,
+        # one regional and one age boost; -1 marks an unused slot
+        interests = np.full((count, 8), -1)
+        personas = rng.choice(len(self.personas), size=count, p=self.persona_weights[(age_group, region)])
+        for persona, (weights, interest_lists) in enumerate(self.subcategory_tables):
+            rows = np.flatnonzero(personas == persona)
+            if not len(rows):
+                continue
+            subcategories = rng.choice(len(weights), size=len(rows), p=weights)
+            for subcategory, ids in enumerate(interest_lists):
+                sub_rows = rows[subcategories == subcategory]
+                k = min(4, len(ids))
+                interests[sub_rows, :k] = ids[_sample_rows(rng, len(sub_rows), len(ids), k)]
+        
+        clothing = rng.integers(len(self.clothing_sizes), size=count)
+        shoe = rng.integers(len(self.shoe_sizes), size=count)
+        ring = rng.integers(len(self.ring_sizes), size=count)
+        restriction_counts = rng.integers(0, 3, size=count)
+        restriction_picks = _sample_rows(rng, count, len(self.common_restrictions), 2)
+        ages = rng.integers(len(self.age_groups), size=count)
+        genders = rng.integers(len(self.genders), size=count)
+        
+        # Demographic variations
+        seasonal = self.seasonal_ids[season]
+        interests[:, 4:6] = seasonal[_sample_rows(rng, count, len(seasonal), 2)]
+        regional = self.regional_ids[region]
+        interests[:, 6] = regional[rng.integers(len(regional), size=count)]
+        style_boost = self.regional_preferences[region]['style_boost']
+        styles = _optional(rng.random(count) < 0.3, rng.integers(len(style_boost), size=count))
+        
+        # Profile variations
+        seasonal_preferences = _optional(
+            rng.random(count) < 0.3, rng.integers(len(SEASONAL_PREFERENCES), size=count)
+        )
+        brand_preferences = _optional(
+            rng.random(count) < 0.4, rng.integers(len(BRAND_PREFERENCES), size=count)
+        )
+        shopping_styles = _optional(
+            rng.random(count) < 0.25, rng.integers(len(SHOPPING_STYLES), size=count)
+        )
+        boost_picks = rng.random(count)
+        for age, boosts in enumerate(self.age_boost_ids):
+            rows = ages == age
+            interests[rows, 7] = boosts[(boost_picks[rows] * len(boosts)).astype(int)]
+        
+        # Keep the first occurrence of each interest, drop those reduced for
+        # the age group; the boost is only added if not already present
+        keep = interests >= 0
+        for column in range(1, 8):
+            keep[:, column] &= ~(
+                (interests[:, :column] == interests[:, column:column + 1]) & keep[:, :column]
+            ).any(axis=1)
+        keep[:, :7] &= ~self.age_reduced[ages[:, None], interests[:, :7]]
+        first = keep & (np.cumsum(keep, axis=1) == 1)
+        
+        restriction_index = np.where(
+            restriction_counts == 0, 0,
+            np.where(
+                restriction_counts == 1,
+                1 + restriction_picks[:, 0],
+                1 + len(self.common_restrictions) * (1 + restriction_picks[:, 0]) + restriction_picks[:, 1]
+            )
+        )
+        return {
+            'region': region,
+            'interests': interests,
+            'keep': keep,
+            'first': first,
+            'clothing': clothing,
+            'shoe': shoe,
+            'ring': ring,
+            'restrictions': restriction_index,
+            'ageGroup': ages,
+            'gender': genders,
+            'stylePreference': styles,
+            'seasonalPreference': seasonal_preferences,
+            'brandPreference': brand_preferences,
+            'shoppingStyle': shopping_styles,
+        }
+    
+    def _join_interests(self, columns: Dict[str, np.ndarray], names: np.ndarray,
+                        separated: np.ndarray) -> np.ndarray:
+        """Join each row's kept interests with ', ', column by column."""
+        interests, keep, first = columns['interests'], columns['keep'], columns['first']
+        joined = np.full(len(interests), '', dtype=object)
+        for column in range(interests.shape[1]):
+            ids = interests[:, column]
+            joined += np.where(first[:, column], names[ids], np.where(keep[:, column], separated[ids], ''))
+        return joined
+    
+    def _values(self, columns: Dict[str, np.ndarray], key: str, encoded: bool) -> np.ndarray:
+        tables = self.style_tables[columns['region']] if key == 'stylePreference' else self.value_tables[key]
+        return tables[encoded][columns[key]]
+    
+    def _profiles(self, columns: Dict[str, np.ndarray]) -> List[Dict]:
+        interests = self._join_interests(columns, self.interest_names, self.interest_separated)
+        rows = zip(interests.tolist(), *(
+            self._values(columns, key, False).tolist()
+            for key in ('clothing', 'shoe', 'ring', 'restrictions', 'ageGroup', 'gender') + OPTIONAL_KEYS
+        ))
+        profiles = []
+        for interest, clothing, shoe, ring, restrictions, age_group, gender, style, seasonal, brand, shopping in rows:
+            profile = {
+                'interests': interest,
+                'sizes': {'clothing': clothing, 'shoe': shoe, 'ring': ring},
+                'restrictions': restrictions,
+                'ageGroup': age_group,
+                'gender': gender,
+            }
+            if style is not None:
+                profile['stylePreference'] = style
+            if seasonal is not None:
+                profile['seasonalPreference'] = seasonal
+            if brand is not None:
+                profile['brandPreference'] = brand
+            if shopping is not None:
+                profile['shoppingStyle'] = shopping
+            profiles.append(profile)
+        return profiles
+    
+    def _json_lines(self, columns: Dict[str, np.ndarray]) -> List[str]:
+        """The profiles as compact JSON, byte for byte what ``json.dumps`` gives."""
+        def encoded(key):
+            return self._values(columns, key, True)
+        
+        lines = '{"interests":"' + self._join_interests(
+            columns, self.interest_json, self.interest_json_separated
+        ) + '","sizes":{"clothing":' + encoded('clothing') + ',"shoe":' + encoded('shoe') \
+            + ',"ring":' + encoded('ring') + '},"restrictions":' + encoded('restrictions') \
+            + ',"ageGroup":' + encoded('ageGroup') + ',"gender":' + encoded('gender')
+        for key in OPTIONAL_KEYS:
+            lines += encoded(key)
+        return (lines + '}').tolist()
+    
+    def _iter_batches(self, num_profiles: int, shuffle: bool, assemble) -> Iterator:
+        distribution = self._calculate_demographic_distribution(num_profiles)
+        demographics = list(distribution)
+        remaining = np.array([distribution[demographic] for demographic in demographics], dtype=np.int64)
+        
+        while remaining.sum():
+            take = min(BATCH_SIZE, int(remaining.sum()))
+            if shuffle:
+                # Which buckets the next ``take`` profiles of a shuffled
+                # dataset come from: drawn without replacement
+                counts = self.np_rng.multivariate_hypergeometric(remaining, take)
+            else:
+                before = np.cumsum(remaining) - remaining
+                counts = np.clip(take - before, 0, remaining)
+            remaining -= counts
+            
+            batches = [
+                assemble(self._draw_bucket(*demographic, int(count))) if count else []
+                for demographic, count in zip(demographics, counts)
+            ]
+            if shuffle:
+                labels = self.np_rng.permutation(np.repeat(np.arange(len(demographics)), counts))
+                batch_iters = [iter(batch) for batch in batches]
+                for label in labels.tolist():
+                    yield next(batch_iters[label])
+            else:
+                for batch in batches:
+                    yield from batch
+    
+    def iter_production_preferences(self, num_profiles: int, shuffle: bool = True) -> Iterator[Dict]:
+        return self._iter_batches(num_profiles, shuffle, self._profiles)
+    
+    def iter_json_lines(self, num_profiles: int, shuffle: bool = True) -> Iterator[str]:
+        return self._iter_batches(num_profiles, shuffle, self._json_lines)
+    
+    def iter_bucket(self, age_group: str, region: str, season: str, count: int) -> Iterator[Dict]:
+        for start in range(0, count, BATCH_SIZE):
+            yield from self.generate_bucket(age_group, region, season, min(BATCH_SIZE, count - start))
+    
+    def iter_bucket_lines(self, age_group: str, region: str, season: str, count: int) -> Iterator[str]:
+        for start in range(0, count, BATCH_SIZE):
+            size = min(BATCH_SIZE, count - start)
+            yield from self._json_lines(self._draw_bucket(age_group, region, season, size))
+    
+    def generate_bucket(self, age_group: str, region: str, season: str, count: int) -> List[Dict]:
+        """Generate ``count`` profiles of one demographic bucket."""
+        return self._profiles(self._draw_bucket(age_group, region, season, count))
+
+# Profile generators by name, for generate_production_data
+ENGINES = {
+    'python': ProductionPreferenceGenerator,
+    'numpy': BatchPreferenceGenerator,
+}
+
+def interleave(counts: Dict, rng=random) -> Iterator:
+    """Yield each key ``counts[key]`` times, in uniformly random order.
+    
+    The remaining counts live in a Fenwick tree, so picking the next key
+    costs O(log keys) instead of a scan over all of them. The draws are
+    the same as a scan's, so a seeded ``rng`` gives the same order.
+    """
+    keys = list(counts)
+    size = len(keys)
+    # tree[i] holds the remaining counts of keys i - lowbit(i) + 1 .. i (1-based)
+    tree = [0] * (size + 1)
+    for index, key in enumerate(keys, 1):
+        tree[index] += counts[key]
+        parent = index + (index & -index)
+        if parent <= size:
+            tree[parent] += tree[index]
+    steps = [1 << bit for bit in reversed(range(size.bit_length()))]
+    randrange = rng.randrange
+    for total in range(sum(counts.values()), 0, -1):
+        # Pick the next key with probability proportional to what is left:
+        # the first one whose running total exceeds the draw
+        position = randrange(total)
+        index = 0
+        for step in steps:
+            probe = index + step
+            if probe <= size and tree[probe] <= position:
+                index = probe
+                position -= tree[probe]
+        yield keys[index]
+        # index is the chosen key's 0-based position; take one from its count
+        index += 1
+        while index <= size:
+            tree[index] -= 1
+            index += index & -index
+
+@contextmanager
+def open_output(output_file: str):
+    """Open ``output_file`` for text writing, gzip-compressed if it ends in ``.gz``.
+    
+    The gzip header carries no name or timestamp, so equal content always
+    gives equal bytes.
+    """
+    with ExitStack() as stack:
+        if output_file.endswith('.gz'):
+            # GzipFile does not close a file object it was handed; the stack does
+            raw = stack.enter_context(open(output_file, 'wb'))
+            compressed = stack.enter_context(
+                gzip.GzipFile(filename='', fileobj=raw, mode='wb', compresslevel=6, mtime=0)
+            )
+            yield stack.enter_context(io.TextIOWrapper(compressed, encoding='utf-8', newline='\n'))
+        else:
+            yield stack.enter_context(open(output_file, 'w', encoding='utf-8', newline='\n'))
+
+def _is_json_lines(output_file: str) -> bool:
+    if output_file.endswith('.gz'):
+        output_file = output_file[:-3]
+    return output_file.endswith('.jsonl')
+
+def _write_lines(lines: Iterable[str], output_file: str) -> int:
+    """Write JSON-encoded profiles in the format ``output_file`` calls for."""
+    json_lines = _is_json_lines(output_file)
+    directory = os.path.dirname(output_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    # Same extension as the final file, so it is compressed alike
+    tmp_file = os.path.join(directory, '.tmp-' + os.path.basename(output_file))
+    count = 0
+    try:
+        with open_output(tmp_file) as f:
+            if not json_lines:
+                f.write('[')
+            for line in lines:
+                if json_lines:
+                    f.write(line + '\n')
+                else:
+                    f.write(('\n' if count == 0 else ',\n') + line)
+                count += 1
+            if not json_lines:
+                f.write('\n]\n')
+        os.replace(tmp_file, output_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    return count
+
+# Most profiles in one shard; fixed so shards do not depend on the worker count
+SHARD_SIZE = 50000
+
+def plan_shards(num_profiles: int) -> List[Tuple[Tuple[str, str, str], int, int]]:
+    """Split the demographic buckets into ``(demographic, chunk, count)`` shards."""
+    distribution = ProductionPreferenceGenerator()._calculate_demographic_distribution(num_profiles)
+    shards = []
+    for demographic, count in distribution.items():
+        for chunk, start in enumerate(range(0, count, SHARD_SIZE)):
+            shards.append((demographic, chunk, min(SHARD_SIZE, count - start)))
+    return shards
+
+def generate_shard(seed, demographic: Tuple[str, str, str], chunk: int, count: int,
+                   output_file: str, engine: str = 'python') -> int:
+    """Generate one shard with its own RNG, derived from ``seed`` and the shard."""
+    age_group, region, season = demographic
+    generator = ENGINES[engine](seed=f"{seed}:{age_group}:{region}:{season}:{chunk}")
+    return _write_lines(generator.iter_bucket_lines(age_group, region, season, count), output_file)
+
+def merge_shards(shard_files: List[Tuple[str, int]], output_file: str, seed) -> int:
+    """Merge ``(path, count)`` JSONL shards into one shuffled dataset.
+    
+    Shards are read line by line and interleaved like the buckets of an
+    unsharded run, so the merge needs one open file per shard and nothing
+    more.
+    """
+    readers = {}
+    try:
+        for path, _ in shard_files:
+            readers[path] = open(path, 'r', encoding='utf-8')
+        order = interleave(dict(shard_files), random.Random(f"{seed}:merge"))
+        return _write_lines((readers[path].readline().rstrip('\n') for path in order), output_file)
+    finally:
+        for reader in readers.values():
+            reader.close()
+
+def generate_sharded(num_profiles: int, output_file: str, seed=0, workers: Optional[int] = None,
+                     engine: str = 'python') -> int:
+    """Generate profiles in parallel shards and merge them into ``output_file``.
+    
+    Every shard is seeded from ``seed`` and its place in the demographic
+    distribution, so a given seed produces byte-identical output whatever
+    the number of ``workers``.
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = plan_shards(num_profiles)
+    directory = os.path.dirname(output_file) or '.'
+    os.makedirs(directory, exist_ok=True)
+    shard_dir = tempfile.mkdtemp(prefix='.shards-', dir=directory)
+    try:
+        paths = [os.path.join(shard_dir, f"shard-{index:05d}.jsonl") for index in range(len(shards))]
+        if workers == 1:
+            counts = [generate_shard(seed, *shard, path, engine) for shard, path in zip(shards, paths)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(generate_shard, seed, *shard, path, engine)
+                    for shard, path in zip(shards, paths)
+                ]
+                counts = [future.result() for future in futures]
+        return merge_shards(list(zip(paths, counts)), output_file, seed)
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+def generate_production_data(num_profiles: int, output_file: str, seed=None,
+                             workers: Optional[int] = None, engine: str = 'python'):
+    if seed is not None or (workers or 1) > 1:
+        # Reproducible, and parallel across processes
+        generate_sharded(num_profiles, output_file, seed if seed is not None else 0, workers, engine)
+    else:
+        generator = ENGINES[engine]()
+        # Streamed, so memory stays flat however many profiles are generated
+        _write_lines(generator.iter_json_lines(num_profiles), output_file)
     
     print(f"Generated {num_profiles} production-ready preference profiles and saved to {output_file}")
 
 if __name__ == "__main__":
-    generate_production_data(1000000, 'data/production_preferences.json')  # Generate 1 million profiles
- 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate synthetic preference profiles")
+    parser.add_argument('--profiles', type=int, default=1000000)
+    parser.add_argument('--output', default='data/production_preferences.json',
+                        help="output file; .jsonl for JSON Lines, add .gz to compress")
+    parser.add_argument('--seed', type=int, help="make the output reproducible")
+    parser.add_argument('--workers', type=int, help="generate shards in this many processes")
+    parser.add_argument('--engine', default='python', choices=sorted(ENGINES),
+                        help="'numpy' draws whole batches at once and is much faster")
+    args = parser.parse_args()
+    generate_production_data(args.profiles, args.output, args.seed, args.workers, args.engine)
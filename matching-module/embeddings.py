@@ -0,0 +1,68 @@
+import logging
+import os
+import numpy as np
+from typing import Dict, List
+
+from quantization import EmbeddingStore
+
+logger = logging.getLogger(__name__)
+
+# Local directory holding a saved sentence-transformer model
+DEFAULT_EMBEDDING_MODEL_PATH = os.path.join('models', 'sentence-transformer')
+
+
+class SemanticEncoder:
+    """Sentence-transformer encoder loaded lazily from a local directory.
+
+    The model is never downloaded: ``model_path`` must point at a model
+    saved with ``SentenceTransformer.save``, so encoding works offline.
+    """
+
+    def __init__(self, model_path: str = None, batch_size: int = 64):
+        self.model_path = model_path or os.environ.get(
+            'EMBEDDING_MODEL_PATH', DEFAULT_EMBEDDING_MODEL_PATH
+        )
+        self.batch_size = batch_size
+        self._model = None
+
+    def _load(self):
+        if not os.path.isdir(self.model_path):
+            raise FileNotFoundError(
+                f"Sentence-transformer model not found at {self.model_path}; "
+                "save one there or set EMBEDDING_MODEL_PATH"
+            )
+        # Keep the Hugging Face hub from reaching out to the network
+        os.environ.setdefault('HF_HUB_OFFLINE', '1')
+        os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+        from sentence_transformers import SentenceTransformer
+
+        logger.info(f"Loading sentence-transformer from {self.model_path}")
+        self._model = SentenceTransformer(self.model_path, device='cpu', local_files_only=True)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts as L2-normalized float32 rows."""
+        if self._model is None:
+            self._load()
+        embeddings = self._model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_model'] = None
+        return state
+
+
+def product_embedding_text(product: Dict) -> str:
+    """Text a product is embedded from."""
+    return f"{product.get('title', '')}. {product.get('category', '')}. {product.get('description', '')}"
+
+
+def load_embeddings(path: str) -> EmbeddingStore:
+    """Memory-map a saved embedding matrix read-only."""
+    return EmbeddingStore.load(path)
@@ -0,0 +1,82 @@
+from collections import deque
+from typing import Iterable, Iterator, Set, Tuple
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over a fixed set of keywords.
+
+    Finds every keyword that occurs anywhere in a text in a single pass,
+    with the same semantics as ``keyword in text`` for each keyword: matches
+    may overlap and may sit inside longer words, so "women" also reports
+    "men". The cost of a scan grows with the text length and the number of
+    hits, not with the number of keywords. Keywords and text may also both
+    be bytes, e.g. to scan a memory-mapped buffer without decoding it.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = frozenset(keyword for keyword in keywords if keyword)
+
+        # Trie of keyword characters
+        self._goto = [{}]
+        self._output = [()]
+        for keyword in self.keywords:
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._output.append(())
+                state = next_state
+            self._output[state] = (keyword,)
+
+        # Failure links in breadth-first order; each state also reports the
+        # keywords of the states its failure chain reaches
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield ``(end, keyword)`` for every occurrence, ``end`` exclusive."""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                for keyword in output[state]:
+                    yield position + 1, keyword
+
+    def find(self, text: str) -> Set[str]:
+        """Return the set of keywords that occur in ``text``."""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        visited = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                visited.add(state)
+
+        found = set()
+        for state in visited:
+            found.update(output[state])
+        return found
@@ -1,35 +1,92 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from routes import router
 import uvicorn
+from artifact import ArtifactError, DEFAULT_ARTIFACT_DIR, artifact_lock
 from model import ProductRecommender
-from data_fetcher import DataFetcher
+from data_fetcher import AsyncDataFetcher, DataFetcher
+from metrics import REGISTRY
+from reloader import ModelReloader
+from scoring_pool import ScoringPool
 import os
 import joblib
 
-def initialize_model():
-    """Initialize or load the model."""
-    model_path = 'models/model.pkl'
+def initialize_model(products=None):
+    """Load the model artifact, building it first if there is none.
+    
+    Every uvicorn worker maps the same artifact files, so the catalog and
+    scoring arrays are shared between workers instead of copied into each.
+    Given ``products``, the artifact is rebuilt unless it was already
+    trained on exactly that catalog (e.g. by another worker).
+    """
+    artifact_path = os.environ.get('MODEL_ARTIFACT_DIR', DEFAULT_ARTIFACT_DIR)
+    target_version = None
+    if products is not None:
+        target_version = ProductRecommender._compute_catalog_version(products)
     
     # Create models directory if it doesn't exist
     os.makedirs('models', exist_ok=True)
     
+    # Workers starting together build the artifact only once
+    with artifact_lock(artifact_path):
+        model = None
+        try:
+            if os.path.exists(artifact_path):
+                print(f"Loading model artifact from {artifact_path}...")
+                model = ProductRecommender.load(artifact_path)
+                if target_version is None or model.catalog_version == target_version:
+                    return model
+        except ArtifactError as e:
+            print(f"Error loading model artifact: {e}")
+        
+        build_model(artifact_path, products, previous=model)
+        return ProductRecommender.load(artifact_path)
+
+def build_model(artifact_path, products=None, previous=None):
+    """Write a model artifact, from a legacy pickle or by training.
+    
+    If the ``previous`` model, e.g. one trained on an older catalog, learned
+    its affinities from a training corpus (see ``train.py``), they are
+    carried over to the new catalog instead of being retrained on a
+    placeholder profile.
+    """
+    legacy_model_path = 'models/model.pkl'
+    
+    # Convert a model pickled by earlier versions to the artifact format
     try:
-        if os.path.exists(model_path):
-            print("Loading existing model...")
-            return joblib.load(model_path)
+        if products is None and os.path.exists(legacy_model_path):
+            print("Converting pickled model to an artifact...")
+            joblib.load(legacy_model_path).save(artifact_path)
+            return
     except Exception as e:
         print(f"Error loading model: {e}")
     
     print("Initializing new model...")
-    model = ProductRecommender()
-    data_fetcher = DataFetcher()
+    # SEMANTIC_WEIGHT > 0 enables embedding scoring with a local model
+    model = ProductRecommender(
+        semantic_weight=float(os.environ.get('SEMANTIC_WEIGHT', '0')),
+        embedding_model_path=os.environ.get('EMBEDDING_MODEL_PATH'),
+        embedding_dtype=os.environ.get('EMBEDDING_DTYPE', 'float32'),
+        ann_candidates=int(os.environ.get('ANN_CANDIDATES', '0')),
+        ann_n_probe=int(os.environ.get('ANN_N_PROBE', '8')),
+    )
     
     print("Training new model...")
-    products = data_fetcher.get_products()
+    if products is None:
+        products = DataFetcher().get_products()
     if not products:
         raise Exception("No products available for training. Please check the data source.")
     print(f"Fetched {len(products)} products for training")
     
+    if previous is not None and previous.corpus_trained:
+        print(f"Keeping affinities learned from {previous.training_profiles} training profiles")
+        model.affinity_table = previous.affinity_table
+        model.training_profiles = previous.training_profiles
+        model.corpus_trained = True
+        model.train(products, None, artifact_path)
+        print("Model training completed")
+        return
+    
     sample_prefs = {
         "interests": "general",
         "wishlist": "",
@@ -38,33 +95,95 @@ def initialize_model():
         "gender": "prefer not to say",
     }
     
-    model.train(products, sample_prefs)
+    # Training also saves the model artifact
+    model.train(products, sample_prefs, artifact_path)
     print("Model training completed")
+
+def create_scoring_pool(model):
+    """Scoring pool configured from the environment."""
+    # SCORING_MODE is 'inline', 'thread' or 'process'; SCORING_MAX_PENDING
+    # bounds queued calls before requests are turned away with a 503
+    return ScoringPool(
+        model,
+        mode=os.environ.get('SCORING_MODE', 'thread'),
+        max_workers=int(os.environ.get('SCORING_WORKERS', '0')) or None,
+        max_pending=int(os.environ.get('SCORING_MAX_PENDING', '0')) or None,
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Serve immediately; the model loads and the catalog refreshes in the background."""
+    data_fetcher = AsyncDataFetcher()
+    await data_fetcher.start()
+    app.state.data_fetcher = data_fetcher
     
-    # Save the trained model
+    # MODEL_WATCH_INTERVAL: seconds between checks for a new artifact or
+    # catalog; REBUILD_ON_CATALOG_CHANGE=0 only reloads saved artifacts
+    reloader = ModelReloader(
+        initialize_model,
+        create_scoring_pool,
+        artifact_path=os.environ.get('MODEL_ARTIFACT_DIR', DEFAULT_ARTIFACT_DIR),
+        data_fetcher=data_fetcher,
+        watch_interval=float(os.environ.get('MODEL_WATCH_INTERVAL', '30')),
+        rebuild_on_catalog_change=os.environ.get('REBUILD_ON_CATALOG_CHANGE', '1') != '0',
+    )
+    reloader.start()
+    app.state.reloader = reloader
     try:
-        joblib.dump(model, model_path)
-        print("Model saved successfully")
-    except Exception as e:
-        print(f"Warning: Could not save model: {e}")
-    
-    return model
-
-# Initialize model and data fetcher
-model = initialize_model()
-data_fetcher = DataFetcher()
+        yield
+    finally:
+        await reloader.stop()
+        await data_fetcher.stop()
 
 app = FastAPI(
     title="Secret Santa Gift Matcher",
     description="API for matching users with gift recommendations based on preferences",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Make model available to routes
-app.state.model = model
-app.state.data_fetcher = data_fetcher
-
 app.include_router(router)
 
+def _serving_gauge(read):
+    """Gauge callback reading from the model currently serving, if any."""
+    def callback():
+        reloader = getattr(app.state, 'reloader', None)
+        serving = reloader.current if reloader is not None else None
+        return read(serving) if serving is not None else {}
+    return callback
+
+def _fetched_catalog_size():
+    data_fetcher = getattr(app.state, 'data_fetcher', None)
+    return {(): len(data_fetcher.get_products())} if data_fetcher is not None else {}
+
+REGISTRY.gauge(
+    'matcher_catalog_products', 'Products in the fetched catalog',
+    callback=_fetched_catalog_size,
+)
+REGISTRY.gauge(
+    'matcher_model_products', 'Products in the catalog the serving model was trained on',
+    callback=_serving_gauge(lambda serving: {(): len(serving.model.product_index)}),
+)
+REGISTRY.gauge(
+    'matcher_ranking_cache', 'Ranking cache counters of the serving model in this process',
+    labels=('stat',),
+    callback=_serving_gauge(lambda serving: {
+        (stat,): serving.model.ranking_cache.stats()[stat]
+        for stat in ('size', 'hits', 'misses', 'evictions', 'expirations')
+    }),
+)
+REGISTRY.gauge(
+    'matcher_scoring_pending', 'Scoring calls running or queued in the pool',
+    callback=_serving_gauge(lambda serving: {(): serving.pool.pending}),
+)
+REGISTRY.gauge(
+    'matcher_model_reloads', 'Models loaded by this worker since startup',
+    callback=_serving_gauge(lambda serving: {(): app.state.reloader.reload_count}),
+)
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=False)  # Disable auto-reload
+    # Workers share the memory-mapped model artifact
+    uvicorn.run(
+        "main:app", host="0.0.0.0", port=8000, reload=False,  # Disable auto-reload
+        workers=int(os.environ.get('WEB_CONCURRENCY', '1'))
+    )
@@ -1,43 +1,347 @@
-import joblib
 import numpy as np
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import hashlib
 import json
 import os
+from affinity import AffinityBuilder, AffinityTable, interest_terms, lookup_groups, row_affinity
+from ann_index import IVFIndex
+from artifact import ArtifactError, ArtifactReader, ArtifactWriter, ColumnarCatalog, DEFAULT_ARTIFACT_DIR
+from cache import RankingCache, RankedEntry
+from data_fetcher import catalog_version
+from embeddings import SemanticEncoder, product_embedding_text, load_embeddings
+from keyword_matcher import KeywordMatcher
+from metrics import stage
+from pagination import top_k, encode_cursor, decode_cursor, InvalidCursorError
+from preference_loader import batched
+from product_index import ProductIndex
+from quantization import EmbeddingStore, scales_path
+
+# Indicators for _calculate_gender_multiplier
+MULTIPLIER_FEMININE = {'women', 'womens', 'female', 'ladies', 'girl', 'feminine', 'princess', 'cute', 'kawaii'}
+MULTIPLIER_MASCULINE = {'men', 'mens', 'male', 'masculine', 'guy', 'boy', 'gaming', 'beard'}
+MULTIPLIER_TECH = {'computer', 'gaming', 'electronics', 'digital', 'drive', 'ssd', 'storage', 'tech'}
+MULTIPLIER_MATCHER = KeywordMatcher(MULTIPLIER_FEMININE | MULTIPLIER_MASCULINE | MULTIPLIER_TECH)
+
+# Categories suggested to profiles with a strong gender preference
+FEMININE_SUGGESTED_CATEGORIES = ['women', 'womens', 'jewelry', 'accessories', 'beauty']
+MASCULINE_SUGGESTED_CATEGORIES = ['men', 'mens', 'masculine']
+
+# Ranked products kept per cached profile (a few pages of 6)
+DEFAULT_CACHE_DEPTH = 120
+
+# Upper bound on profile x product cells scored at once in a batch
+BATCH_SCORE_CELLS = 4_000_000
+
+# Training preference profiles processed together; the corpus is never held whole
+PREFERENCE_BATCH_SIZE = 10_000
 
 class ProductRecommender:
-    def __init__(self):
+    def __init__(self, scoring_mode='vectorized', cache_size=1024, cache_ttl=600.0,
+                 cache_depth=DEFAULT_CACHE_DEPTH, semantic_weight=0.0, embedding_model_path=None,
+                 embedding_dtype='float32', ann_candidates=0, ann_n_probe=8, ann_n_lists=None):
         # Initialize model components
         self.product_data = None
+        self.product_index = None
+        self.catalog_version = None
+        
+        # 'vectorized' scores the catalog with NumPy, 'python' one product at a time
+        self.scoring_mode = scoring_mode
+        
+        # Ranked results per normalized profile, invalidated on retrain
+        self.ranking_cache = RankingCache(cache_size, cache_ttl)
+        self.cache_depth = cache_depth
+        
+        # Optional semantic scoring: share of the final score taken by the
+        # cosine similarity between the user's text and each product
+        self.semantic_weight = semantic_weight
+        self.encoder = SemanticEncoder(embedding_model_path) if semantic_weight > 0 else None
+        # Storage for the product embeddings: 'float32', 'float16' or 'int8'
+        self.embedding_dtype = embedding_dtype
+        self.product_embeddings = None
+        
+        # Optional ANN retrieval over the embeddings: only the nearest
+        # ann_candidates products are re-scored (0 scores the whole catalog)
+        self.ann_candidates = ann_candidates
+        self.ann_n_probe = ann_n_probe
+        self.ann_n_lists = ann_n_lists
+        self.ann_index = None
+        
+        # Preference profiles the model was trained on and the interest ->
+        # product affinities learned from them; corpus_trained is set when
+        # they came from a corpus rather than a single profile
+        self.training_profiles = 0
+        self.corpus_trained = False
+        self.affinity_table = AffinityTable.empty()
+        
+        # Set when the model was loaded from a saved artifact
+        self.artifact_path = None
+        self.artifact_created_at = None
+        self.model_version = None
         
         # Load data files
         self._load_interest_clusters()
         self._load_personality_affinities()
         self._load_category_hierarchy()
     
-    def train(self, products, preferences):
-        """Train the recommendation model."""
+    def train(self, products, preferences, artifact_path=DEFAULT_ARTIFACT_DIR):
+        """Train the recommendation model and save it to ``artifact_path``.
+        
+        With ``artifact_path=None`` the model is not saved, e.g. so the
+        caller can publish it with ``save`` under ``artifact_lock``.
+        
+        ``preferences`` is one profile, e.g. a placeholder when there is no
+        training data, or an iterable of profiles (a corpus), such as
+        ``preference_loader.iter_preferences``; it is consumed as a stream in
+        batches of ``PREFERENCE_BATCH_SIZE``. Together with the interest
+        clusters and personality affinities it yields the interest -> product
+        affinity table that relevance is scored from. With ``preferences=None``
+        the current table's terms and related interests, e.g. those of a
+        loaded artifact, are kept and only resolved against ``products``.
+        """
         # Save products for later use
         self.product_data = products
+        self.artifact_path = None
+        self.artifact_created_at = None
+        self.model_version = None
+        
+        # Precompute normalized product text and indicator flags once
+        self.product_index = ProductIndex(products)
+        self.catalog_version = self._compute_catalog_version(products)
+        self.ranking_cache.clear()
+        
+        # Encode every product once; requests only encode the user's text.
+        # Both stay in memory until save() writes them into the artifact.
+        if self.encoder is not None:
+            self._build_product_embeddings(products)
+            if self.ann_candidates > 0:
+                self._build_ann_index()
+        
+        if preferences is None:
+            self.affinity_table = self.affinity_table.rebuild(self.product_index)
+        else:
+            self.corpus_trained = not isinstance(preferences, dict)
+            self.training_profiles = self._fit_preferences(preferences)
         
         # Save model
-        os.makedirs('models', exist_ok=True)
-        joblib.dump(self, 'models/model.pkl')
+        if artifact_path is not None:
+            self.save(artifact_path)
+    
+    def _fit_preferences(self, preferences):
+        """Learn the affinity table from the training preferences; returns their count."""
+        if isinstance(preferences, dict):
+            preferences = [preferences] if preferences else []
+        builder = AffinityBuilder()
+        for batch in batched(preferences or [], PREFERENCE_BATCH_SIZE):
+            builder.add_batch(batch)
+        self.affinity_table = builder.build(
+            self.product_index,
+            lookup_groups(self.interest_clusters) + lookup_groups(self.personality_product_affinities),
+            FEMININE_SUGGESTED_CATEGORIES + MASCULINE_SUGGESTED_CATEGORIES,
+        )
+        return builder.profiles
+    
+    def save(self, path=DEFAULT_ARTIFACT_DIR):
+        """Write the trained model as a versioned, memory-mappable artifact.
+        
+        The directory holds a manifest, the catalog, the product index and the
+        affinity table as flat NumPy arrays, the lookup tables as JSON and, when enabled, the
+        embeddings and ANN index. ``load`` maps it back in without unpickling.
+        """
+        writer = ArtifactWriter(path)
+        try:
+            catalog = self.product_data
+            if not isinstance(catalog, ColumnarCatalog):
+                catalog = ColumnarCatalog.from_products(catalog)
+            arrays = {
+                **catalog.to_arrays(), **self.product_index.to_arrays(), **self.affinity_table.to_arrays(),
+            }
+            for name, array in arrays.items():
+                writer.add_array(name, array)
+            writer.add_json('lookups', {
+                'interestClusters': self.interest_clusters,
+                'personalityAffinities': self.personality_product_affinities,
+                'categoryHierarchy': self.category_hierarchy,
+            })
+            if self.product_embeddings is not None:
+                embeddings_path = self.product_embeddings.save(writer.file_path('embeddings.npy'))
+                if self.product_embeddings.scales is not None:
+                    writer.add_file(os.path.basename(scales_path(embeddings_path)))
+                if self.ann_index is not None:
+                    for name, array in self.ann_index.to_arrays().items():
+                        writer.add_array(f'ann.{name}', array)
+            path = writer.commit({
+                'catalogVersion': self.catalog_version,
+                'productCount': len(catalog),
+                'trainingProfiles': self.training_profiles,
+                'corpusTrained': self.corpus_trained,
+                'config': {
+                    'scoring_mode': self.scoring_mode,
+                    'cache_size': self.ranking_cache.max_entries,
+                    'cache_ttl': self.ranking_cache.ttl_seconds,
+                    'cache_depth': self.cache_depth,
+                    'semantic_weight': self.semantic_weight,
+                    'embedding_model_path': self.encoder.model_path if self.encoder else None,
+                    'embedding_dtype': self.embedding_dtype,
+                    'ann_candidates': self.ann_candidates,
+                    'ann_n_probe': self.ann_n_probe,
+                    'ann_n_lists': self.ann_n_lists,
+                },
+            })
+        except Exception:
+            writer.abort()
+            raise
+        # The model is now backed by the artifact; pickles refer to it
+        self.artifact_path = path
+        self.artifact_created_at = writer.manifest['createdAt']
+        self.model_version = writer.manifest['modelVersion']
+        return path
+    
+    @classmethod
+    def load(cls, path=DEFAULT_ARTIFACT_DIR):
+        """Memory-map a model artifact written by ``save``.
+        
+        Every array stays a read-only mapping of the artifact files, so
+        processes that load the same artifact share its pages instead of
+        holding private copies. Raises ``ArtifactError`` if the artifact is
+        missing, incomplete or was written with another schema version.
+        """
+        reader = ArtifactReader(path)
+        manifest = reader.manifest
+        config = manifest['config']
+        lookups = reader.json('lookups')
+        
+        catalog = ColumnarCatalog.from_arrays(reader.arrays('catalog.'))
+        index = ProductIndex.from_arrays(reader.arrays('index.'))
+        if not len(catalog) == len(index) == manifest['productCount']:
+            raise ArtifactError(
+                f"Model artifact {path} is inconsistent: manifest lists {manifest['productCount']} "
+                f"products, catalog has {len(catalog)}, index has {len(index)}"
+            )
+        
+        model = cls.__new__(cls)
+        model.__setstate__({
+            'product_data': catalog,
+            'product_index': index,
+            'catalog_version': manifest['catalogVersion'],
+            'training_profiles': manifest['trainingProfiles'],
+            'corpus_trained': manifest['corpusTrained'],
+            'affinity_table': AffinityTable.from_arrays(reader.arrays('affinity.')),
+            'scoring_mode': config['scoring_mode'],
+            '_cache_config': (config['cache_size'], config['cache_ttl']),
+            'cache_depth': config['cache_depth'],
+            'semantic_weight': config['semantic_weight'],
+            'encoder': (
+                SemanticEncoder(config['embedding_model_path'])
+                if config['semantic_weight'] > 0 else None
+            ),
+            'embedding_dtype': config['embedding_dtype'],
+            'ann_candidates': config['ann_candidates'],
+            'ann_n_probe': config['ann_n_probe'],
+            'ann_n_lists': config['ann_n_lists'],
+            'artifact_path': reader.path,
+            'artifact_created_at': manifest['createdAt'],
+            'model_version': manifest['modelVersion'],
+            'interest_clusters': lookups['interestClusters'],
+            'personality_product_affinities': lookups['personalityAffinities'],
+            'category_hierarchy': lookups['categoryHierarchy'],
+        })
+        embeddings_path = reader.file_path('embeddings.npy')
+        if model.encoder is not None and embeddings_path is not None:
+            model.product_embeddings = load_embeddings(embeddings_path)
+        if model.product_embeddings is not None and len(model.product_embeddings) != len(catalog):
+            raise ArtifactError(
+                f"Model artifact {path} has {len(model.product_embeddings)} embeddings "
+                f"for {len(catalog)} products"
+            )
+        ann_arrays = reader.arrays('ann.')
+        if ann_arrays and model.product_embeddings is not None and model.ann_candidates > 0:
+            try:
+                model.ann_index = IVFIndex.from_arrays(
+                    {name[len('ann.'):]: array for name, array in ann_arrays.items()},
+                    model.product_embeddings, config['ann_n_probe'],
+                )
+            except ValueError as e:
+                raise ArtifactError(f"Model artifact {path} has an unusable ANN index: {e}")
+        return model
     
     def __getstate__(self):
         """Return state values to be pickled."""
         state = self.__dict__.copy()
+        # Cached rankings are process-local
+        ranking_cache = state.pop('ranking_cache', None)
+        if ranking_cache is not None:
+            state['_cache_config'] = (ranking_cache.max_entries, ranking_cache.ttl_seconds)
+        # A model loaded from an artifact pickles as a reference to it, so
+        # worker processes map the same files instead of copying arrays
+        if state.get('artifact_path'):
+            return {
+                '_artifact': (state['artifact_path'], state['artifact_created_at']),
+                '_cache_config': state.get('_cache_config', ()),
+                'scoring_mode': self.scoring_mode,
+                'cache_depth': self.cache_depth,
+            }
         return state
 
     def __setstate__(self, state):
         """Restore state from the unpickled state values."""
+        if '_artifact' in state:
+            path, created_at = state['_artifact']
+            loaded = type(self).load(path)
+            if loaded.artifact_created_at != created_at:
+                raise ArtifactError(f"Model artifact {path} was replaced after this model was pickled")
+            self.__dict__.update(loaded.__dict__)
+            self.ranking_cache = RankingCache(*state['_cache_config'])
+            self.scoring_mode = state['scoring_mode']
+            self.cache_depth = state['cache_depth']
+            return
+        
         self.__dict__.update(state)
         
-        # Reload data from JSON files
-        self._load_interest_clusters()
-        self._load_personality_affinities()
-        self._load_category_hierarchy()
+        # Lookup tables travel with the model; read the data files only
+        # for states that lack them
+        if 'interest_clusters' not in state:
+            self._load_interest_clusters()
+        if 'personality_product_affinities' not in state:
+            self._load_personality_affinities()
+        if 'category_hierarchy' not in state:
+            self._load_category_hierarchy()
+        
+        # Models pickled before these attributes existed
+        self.__dict__.setdefault('scoring_mode', 'vectorized')
+        self.__dict__.setdefault('cache_depth', DEFAULT_CACHE_DEPTH)
+        self.__dict__.setdefault('training_profiles', 0)
+        self.__dict__.setdefault('corpus_trained', False)
+        self.__dict__.setdefault('affinity_table', AffinityTable.empty())
+        self.ranking_cache = RankingCache(*self.__dict__.pop('_cache_config', ()))
+        if self.__dict__.get('product_index') is None and self.product_data is not None:
+            self.product_index = ProductIndex(self.product_data)
+        if self.__dict__.get('catalog_version') is None and self.product_data is not None:
+            self.catalog_version = self._compute_catalog_version(self.product_data)
+        self.__dict__.setdefault('semantic_weight', 0.0)
+        self.__dict__.setdefault('encoder', None)
+        self.__dict__.setdefault('embedding_dtype', 'float32')
+        self.__dict__.setdefault('ann_candidates', 0)
+        self.__dict__.setdefault('ann_n_probe', 8)
+        self.__dict__.setdefault('ann_n_lists', None)
+        self.__dict__.setdefault('artifact_path', None)
+        self.__dict__.setdefault('artifact_created_at', None)
+        self.__dict__.setdefault('model_version', None)
+        self.__dict__.setdefault('product_embeddings', None)
+        self.__dict__.setdefault('ann_index', None)
+
+    def _build_product_embeddings(self, products):
+        """Encode the catalog, quantized to ``embedding_dtype``."""
+        embeddings = self.encoder.encode([product_embedding_text(product) for product in products])
+        self.product_embeddings = EmbeddingStore.quantize(embeddings, self.embedding_dtype)
+
+    def _build_ann_index(self):
+        """Cluster the product embeddings into an IVF index."""
+        self.ann_index = IVFIndex(n_lists=self.ann_n_lists, n_probe=self.ann_n_probe)
+        self.ann_index.build(self.product_embeddings)
+
+    @staticmethod
+    def _compute_catalog_version(products):
+        """Content hash of the catalog; the same one ``DataFetcher`` reports."""
+        return catalog_version(products)
 
     def _load_interest_clusters(self):
         """Load the interest clusters from the JSON file."""
@@ -85,16 +389,15 @@ class ProductRecommender:
         if -0.3 <= gender_score <= 0.3:
             return 1.0
             
+        # All indicator hits in one pass over the text
+        hits = MULTIPLIER_MATCHER.find(text)
+        
         # Strong feminine preference
         if gender_score > 0.3:
-            feminine_indicators = {'women', 'womens', 'female', 'ladies', 'girl', 'feminine', 'princess', 'cute', 'kawaii'}
-            masculine_indicators = {'men', 'mens', 'male', 'masculine', 'guy', 'boy', 'gaming', 'beard'}
-            neutral_tech = {'computer', 'gaming', 'electronics', 'digital', 'drive', 'ssd', 'storage', 'tech'}
-            
             # Check for gender-specific terms
-            feminine_matches = len([word for word in feminine_indicators if word in text])
-            masculine_matches = len([word for word in masculine_indicators if word in text])
-            tech_matches = len([word for word in neutral_tech if word in text])
+            feminine_matches = len(hits & MULTIPLIER_FEMININE)
+            masculine_matches = len(hits & MULTIPLIER_MASCULINE)
+            tech_matches = len(hits & MULTIPLIER_TECH)
             
             if masculine_matches > 0:
                 return 0.1  # Stronger penalty for masculine items
@@ -109,11 +412,11 @@ class ProductRecommender:
             
         # Strong masculine preference
         if gender_score < -0.3:
-            if 'men' in text or 'mens' in text:
+            if 'men' in hits or 'mens' in hits:
                 return 2.0
-            elif 'women' in text or 'womens' in text or 'jewelry' in category:
+            elif 'women' in hits or 'womens' in hits or 'jewelry' in category:
                 return 0.1
-            elif any(tech in text for tech in ['computer', 'gaming', 'electronics', 'digital', 'drive', 'ssd']):
+            elif not hits.isdisjoint(MULTIPLIER_TECH - {'storage', 'tech'}):
                 return 0.3
             else:
                 return 0.5  # Penalty for gender-neutral items
@@ -128,19 +431,20 @@ class ProductRecommender:
             preferences = preferences['preferences']
         
         # Get basic preferences
-        interests = preferences.get('interests', '').lower() if preferences else ''
-        hobbies = preferences.get('hobbies', '').lower() if preferences else ''
-        wishlist = preferences.get('wishlist', '').lower() if preferences else ''
-        gender = preferences.get('gender', '').lower() if preferences else ''
+        interests = (preferences.get('interests') or '').lower() if preferences else ''
+        hobbies = (preferences.get('hobbies') or '').lower() if preferences else ''
+        wishlist = (preferences.get('wishlist') or '').lower() if preferences else ''
+        gender = (preferences.get('gender') or '').lower() if preferences else ''
         
         # Combine all text for analysis
         all_text = f"{interests} {hobbies} {wishlist}".lower()
         
         # Calculate gender score
         profile['gender_score'] = self._calculate_gender_score(gender, all_text)
+        profile['semantic_text'] = ' '.join(all_text.split())
         
         # Extract interests and categories
-        profile['primary_interests'] = [w for w in interests.split() if len(w) > 2]
+        profile['primary_interests'] = interest_terms(interests)
         profile['secondary_interests'] = [w for w in hobbies.split() if len(w) > 2]
         
         # Build suggested categories
@@ -148,9 +452,9 @@ class ProductRecommender:
         
         # Add categories based on gender preference
         if profile['gender_score'] > 0.5:  # Strong feminine preference
-            suggested_categories.update(['women', 'womens', 'jewelry', 'accessories', 'beauty'])
+            suggested_categories.update(FEMININE_SUGGESTED_CATEGORIES)
         elif profile['gender_score'] < -0.5:  # Strong masculine preference
-            suggested_categories.update(['men', 'mens', 'masculine'])
+            suggested_categories.update(MASCULINE_SUGGESTED_CATEGORIES)
         
         # Add categories from interests
         for word in profile['primary_interests']:
@@ -204,18 +508,255 @@ class ProductRecommender:
 
     def get_recommendations(self, products, preferences, num_recommendations=20):
         """Get product recommendations based on user preferences."""
-        profile = self._analyze_user_profile(preferences)
-        
-        scored_products = []
-        for product in self.product_data:
-            title = product.get('title', '').lower()
-            category = product.get('category', '').lower()
-            description = product.get('description', '').lower()
-            product_text = f"{title} {description} {category}"
-            
+        page = int(preferences.get('page', 1))
+        page_size = int(preferences.get('pageSize', num_recommendations))
+        recommendations, _ = self.get_recommendation_page(
+            preferences, page, page_size, preferences.get('cursor')
+        )
+        return recommendations
+
+    def get_recommendation_page(self, preferences, page=1, page_size=20, cursor=None):
+        """Get one page of recommendations and an opaque cursor for the next one.
+        
+        Rankings are cached per normalized preferences, so later pages and
+        repeat requests are sliced from the cache without scoring. On a miss
+        only the top ``max(page * page_size, cache_depth)`` products are
+        selected and sorted, doubling the depth until the page is covered.
+        A cursor resumes at the offset right after the previous page and is
+        served the same way, so paging on from a deep page hits the cache.
+        """
+        key = self._preferences_key(preferences)
+        
+        offset = (page - 1) * page_size
+        if cursor:
+            state = decode_cursor(cursor)
+            if state['p'] != key:
+                raise InvalidCursorError("Cursor does not match these preferences")
+            offset = int(state['o'])
+        if offset < 0:
+            return [], None
+        end = offset + page_size
+        
+        cache_key = (self.catalog_version, key)
+        entry = self.ranking_cache.get(cache_key, accept=lambda cached: cached.covers(end))
+        if entry is not None:
+            profile = entry.profile
+            page_products = entry.ranking[offset:end]
+            page_scores = entry.scores[offset:end]
+        else:
+            with stage('profile'):
+                profile = self._analyze_user_profile(preferences)
+            with stage('scoring'):
+                positions, scores = self._score_catalog_batch([profile])
+            with stage('ranking'):
+                entry = self._rank_and_cache(cache_key, profile, positions, scores[0], end)
+                page_products = entry.ranking[offset:end]
+                page_scores = entry.scores[offset:end]
+        
+        next_cursor = None
+        if page_size > 0 and len(page_products) == page_size:
+            next_cursor = encode_cursor({'p': key, 'o': end})
+        
+        with stage('format'):
+            recommendations = self._format_recommendations(page_products, page_scores, profile)
+        return recommendations, next_cursor
+
+    def get_batch_recommendations(self, preferences_list, page=1, page_size=20):
+        """Get one page of recommendations for each of several profiles.
+        
+        Profiles that miss the ranking cache are scored together as one
+        profile-by-product matrix, in chunks that bound its memory use.
+        Results are returned in the order of ``preferences_list``.
+        """
+        offset = (page - 1) * page_size
+        if offset < 0:
+            return [[] for _ in preferences_list]
+        end = offset + page_size
+        
+        results = [None] * len(preferences_list)
+        pending = {}
+        for position, preferences in enumerate(preferences_list):
+            cache_key = (self.catalog_version, self._preferences_key(preferences))
+            entry = self.ranking_cache.get(cache_key, accept=lambda cached: cached.covers(end))
+            if entry is not None:
+                results[position] = self._format_recommendations(
+                    entry.ranking[offset:end], entry.scores[offset:end], entry.profile
+                )
+            else:
+                # Identical profiles in one batch are scored once
+                pending.setdefault(cache_key, (preferences, []))[1].append(position)
+        
+        cache_keys = list(pending)
+        chunk_size = max(1, BATCH_SCORE_CELLS // max(len(self.product_index), 1))
+        for chunk_start in range(0, len(cache_keys), chunk_size):
+            chunk = cache_keys[chunk_start:chunk_start + chunk_size]
+            with stage('profile'):
+                profiles = [self._analyze_user_profile(pending[key][0]) for key in chunk]
+            with stage('scoring'):
+                positions, scores = self._score_catalog_batch(profiles)
+            for row, cache_key in enumerate(chunk):
+                with stage('ranking'):
+                    entry = self._rank_and_cache(cache_key, profiles[row], positions, scores[row], end)
+                with stage('format'):
+                    recommendations = self._format_recommendations(
+                        entry.ranking[offset:end], entry.scores[offset:end], entry.profile
+                    )
+                for position in pending[cache_key][1]:
+                    results[position] = recommendations
+        
+        return results
+
+    def _rank_and_cache(self, cache_key, profile, positions, scores, end):
+        """Rank a scored catalog deep enough to serve ``end`` and cache it."""
+        # Cache a prefix deep enough for this page, doubling as needed
+        depth = max(self.cache_depth, 1)
+        while depth < end:
+            depth *= 2
+        ranking, ranked_scores = self._select_ranked(scores, positions, depth)
+        entry = RankedEntry(profile, ranking, ranked_scores, len(ranking) < depth)
+        self.ranking_cache.put(cache_key, entry)
+        return entry
+
+    @staticmethod
+    def _select_ranked(scores, positions, k):
+        """Select the top ``k`` scored products as catalog positions and scores.
+        
+        ``positions`` maps score columns to catalog positions when only a
+        subset of the catalog was scored; unscored (-inf) products are dropped.
+        """
+        selected = top_k(scores, k)
+        selected = selected[np.isfinite(scores[selected])]
+        ranked_scores = scores[selected]
+        if positions is not None:
+            selected = positions[selected]
+        return selected, ranked_scores
+
+    def _format_recommendations(self, product_indices, scores, profile):
+        """Format ranked catalog positions and their scores as API recommendations."""
+        recommendations = []
+        for i, score in zip(product_indices, scores):
+            product = self.product_data[i]
+            recommendations.append({
+                'id': str(product.get('id', hash(product['title']))),
+                'name': product.get('title', ''),
+                'category': product.get('category', ''),
+                'matchedCategory': self._get_matched_category(i, profile),
+                'price': float(product.get('price', 0)),
+                'imageUrl': product.get('image', ''),
+                'matchScore': int(round(float(score) * 100)),
+                'description': product.get('description', '')
+            })
+        
+        return recommendations
+
+    def _preferences_key(self, preferences):
+        """Stable hash of the normalized preference fields that affect scoring."""
+        preferences = preferences or {}
+        if isinstance(preferences, dict) and 'preferences' in preferences:
+            preferences = preferences['preferences']
+        fields = [
+            ' '.join((preferences.get(field) or '').lower().split())
+            for field in ('interests', 'hobbies', 'wishlist', 'gender')
+        ]
+        return hashlib.sha1('\x1f'.join(fields).encode('utf-8')).hexdigest()[:16]
+
+    def _score_catalog_batch(self, profiles):
+        """Score the catalog for several profiles.
+        
+        Returns ``(positions, scores)``. ``positions`` is None when every
+        product was scored; with ANN retrieval it holds the ascending catalog
+        positions of the scored columns, and products that were not among a
+        profile's candidates score -inf in that profile's row.
+        """
+        positions = None
+        candidates = None
+        queries = None
+        if self.product_embeddings is not None:
+            queries = self.encoder.encode([profile['semantic_text'] for profile in profiles])
+            if self.ann_index is not None:
+                candidates = self.ann_index.search(queries, self.ann_candidates, n_probe=self.ann_n_probe)
+                positions = np.unique(np.concatenate(candidates))
+        
+        if self.scoring_mode == 'python':
+            scores = np.vstack([self._score_products_loop(profile, positions) for profile in profiles])
+        else:
+            scores = self._score_products_batch(profiles, positions)
+        
+        if queries is not None:
+            scores = self._blend_semantic_scores(scores, profiles, queries, positions)
+        if candidates is not None:
+            for row, row_candidates in enumerate(candidates):
+                scores[row, ~np.isin(positions, row_candidates, assume_unique=True)] = -np.inf
+        return positions, scores
+
+    def _blend_semantic_scores(self, scores, profiles, queries, positions=None):
+        """Blend cosine similarity to the precomputed product embeddings into scores."""
+        similarity = np.maximum(self.product_embeddings.similarity(queries, positions), 0.0)
+        # Profiles without any text get no semantic signal
+        similarity[[not profile['semantic_text'] for profile in profiles]] = 0.0
+        return scores * (1.0 - self.semantic_weight) + similarity * self.semantic_weight
+
+    def _score_products_batch(self, profiles, positions=None):
+        """Score the whole catalog against several profiles at once.
+        
+        Returns a profile-by-product matrix of final scores, restricted to
+        the ascending catalog ``positions`` if given.
+        """
+        index = self.product_index
+        size = len(index) if positions is None else len(positions)
+        flags = {
+            name: getattr(index, name) if positions is None else getattr(index, name)[positions]
+            for name in ('has_feminine', 'has_masculine', 'has_neutral', 'has_tech')
+        }
+        
+        # Relevance: summed affinity of the profile terms to each product,
+        # relative to the number of terms
+        relevance = np.zeros((len(profiles), size))
+        for field, weight in (('primary_interests', 0.6), ('suggested_categories', 0.4)):
+            term_lists = [profile[field] for profile in profiles]
+            lengths = np.array([len(terms) for terms in term_lists])[:, None]
+            matches = self.affinity_table.sum_batch(term_lists, index, positions)
+            ratio = np.divide(matches, lengths, out=np.zeros(matches.shape), where=lengths > 0)
+            relevance += weight * np.minimum(1.0, ratio)
+        relevance = np.minimum(1.0, relevance)
+        
+        # Gender fit, mirroring _calculate_product_gender_score
+        gender_preferences = np.array([profile['gender_score'] for profile in profiles])
+        feminine_fit = np.select(
+            [flags['has_masculine'], flags['has_tech'], flags['has_feminine'], flags['has_neutral']],
+            [0.1, 0.2, 1.0, 0.7],
+            default=0.5,
+        )
+        masculine_fit = np.select(
+            [flags['has_feminine'], flags['has_masculine'], flags['has_tech'], flags['has_neutral']],
+            [0.1, 1.0, 0.8, 0.7],
+            default=0.5,
+        )
+        gender = np.ones((len(profiles), size))
+        gender[gender_preferences >= 0.3] = feminine_fit
+        gender[gender_preferences <= -0.3] = masculine_fit
+        
+        # Final score calculation
+        strong = (np.abs(gender_preferences) > 0.5)[:, None]  # Strong gender preference
+        return np.where(
+            strong,
+            # Gender-inappropriate products are effectively excluded
+            np.where(gender < 0.3, 0.1, relevance * 0.4 + gender * 0.4),
+            relevance * 0.6 + gender * 0.2,
+        )
+
+    def _score_products_loop(self, profile, positions=None):
+        """Score the catalog one product at a time (reference implementation)."""
+        index = self.product_index
+        rows = self.affinity_table.lookup(profile['primary_interests'] + profile['suggested_categories'], index)
+        if positions is None:
+            positions = range(len(index))
+        scores = np.empty(len(positions))
+        for column, i in enumerate(positions):
             # Calculate main score components
-            relevance_score = self._calculate_relevance_score(product_text, profile)
-            gender_score = self._calculate_product_gender_score(product_text, profile['gender_score'])
+            affinities = {term: row_affinity(row, i) for term, row in rows.items()}
+            relevance_score = self._calculate_relevance_score(affinities, profile)
+            gender_score = self._calculate_product_gender_score(i, profile['gender_score'])
             
             # Final score calculation
             if abs(profile['gender_score']) > 0.5:  # Strong gender preference
@@ -234,69 +775,41 @@ class ProductRecommender:
                     gender_score * 0.2
                 )
             
-            scored_products.append((final_score, product))
-        
-        # Sort products by score
-        scored_products.sort(key=lambda x: x[0], reverse=True)
-        
-        # Get pagination parameters
-        page = int(preferences.get('page', 1))
-        page_size = int(preferences.get('pageSize', num_recommendations))
-        start_idx = (page - 1) * page_size
-        end_idx = start_idx + page_size
-        
-        # Get the slice of products for the current page
-        page_products = scored_products[start_idx:end_idx]
-        
-        # Format recommendations
-        recommendations = []
-        for score, product in page_products:
-            recommendations.append({
-                'id': str(product.get('id', hash(product['title']))),
-                'name': product.get('title', ''),
-                'category': product.get('category', ''),
-                'matchedCategory': self._get_matched_category(product.get('category', ''), profile),
-                'price': float(product.get('price', 0)),
-                'imageUrl': product.get('image', ''),
-                'matchScore': int(round(score * 100)),
-                'description': product.get('description', '')
-            })
-        
-        return recommendations
+            scores[column] = final_score
+        return scores
 
-    def _calculate_relevance_score(self, product_text, profile):
-        """Calculate how relevant a product is based on interests."""
+    def _calculate_relevance_score(self, affinities, profile):
+        """Calculate how relevant a product is based on interests.
+        
+        ``affinities`` maps each profile term to the product's learned
+        affinity to it: 1 if the product text contains the term, less if it
+        only contains a related interest, 0 otherwise.
+        """
         score = 0.0
         
-        # Check primary interests (direct matches)
-        primary_matches = sum(1 for interest in profile['primary_interests'] 
-                            if interest in product_text)
+        # Check primary interests (direct and related matches)
+        primary_matches = sum(affinities.get(interest, 0.0) for interest in profile['primary_interests'])
         if primary_matches:
             score += 0.6 * min(1.0, primary_matches / len(profile['primary_interests']))
         
         # Check category matches
-        category_matches = sum(1 for cat in profile['suggested_categories'] 
-                             if cat in product_text)
+        category_matches = sum(affinities.get(cat, 0.0) for cat in profile['suggested_categories'])
         if category_matches:
             score += 0.4 * min(1.0, category_matches / len(profile['suggested_categories']))
         
         return min(1.0, score)
 
-    def _calculate_product_gender_score(self, product_text, gender_preference):
+    def _calculate_product_gender_score(self, product_idx, gender_preference):
         """Calculate how well a product matches gender preference."""
         if abs(gender_preference) < 0.3:  # No strong preference
             return 1.0
         
-        # Define gender indicators in product
-        feminine_indicators = {'women', 'womens', 'female', 'ladies', 'feminine', 'girl'}
-        masculine_indicators = {'men', 'mens', 'male', 'masculine', 'guy', 'boy'}
-        neutral_indicators = {'unisex', 'universal', 'generic'}
-        tech_indicators = {'computer', 'gaming', 'electronics', 'digital', 'drive', 'ssd', 'storage', 'tech'}
-        
-        has_feminine = any(ind in product_text for ind in feminine_indicators)
-        has_masculine = any(ind in product_text for ind in masculine_indicators)
-        has_neutral = any(ind in product_text for ind in neutral_indicators)
-        has_tech = any(ind in product_text for ind in tech_indicators)
+        # Gender indicators are precomputed in the product index
+        index = self.product_index
+        has_feminine = index.has_feminine[product_idx]
+        has_masculine = index.has_masculine[product_idx]
+        has_neutral = index.has_neutral[product_idx]
+        has_tech = index.has_tech[product_idx]
         
         if gender_preference > 0:  # Feminine preference
             if has_masculine:
@@ -319,19 +832,19 @@ class ProductRecommender:
                 return 0.7
             return 0.5
 
-    def _get_matched_category(self, category, profile):
+    def _get_matched_category(self, product_idx, profile):
         """Get a user-friendly category match."""
+        index = self.product_index
+        category = index.categories[product_idx]
         if not category:
             return "General"
-            
-        category = category.lower()
         
         # Check for gender-specific categories
         if profile['gender_score'] > 0.5:  # Feminine
-            if any(term in category for term in ['women', 'jewelry', 'beauty']):
+            if index.feminine_category[product_idx]:
                 return f"Women's {category.title()}"
         elif profile['gender_score'] < -0.5:  # Masculine
-            if any(term in category for term in ['men', 'masculine']):
+            if index.masculine_category[product_idx]:
                 return f"Men's {category.title()}"
         
         # Check for interest-based categories
@@ -0,0 +1,52 @@
+import base64
+import json
+import numpy as np
+from typing import Dict
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor is malformed or does not apply."""
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the ``k`` best scores in ranking order.
+
+    Ranking order is score descending with ties broken by index, the same
+    order a stable full sort produces. Only the selected items are sorted,
+    so the cost is O(n + k log k) instead of O(n log n).
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    if k < n:
+        # Value of the k-th best score; take everything above it and fill
+        # the remaining slots with the earliest ties
+        kth_value = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth_value)
+        ties = np.flatnonzero(scores == kth_value)[:k - len(above)]
+        selected = np.concatenate([above, ties])
+    else:
+        selected = np.arange(n)
+
+    return selected[np.lexsort((selected, -scores[selected]))]
+
+
+def encode_cursor(state: Dict) -> str:
+    """Encode pagination state as an opaque URL-safe token."""
+    payload = json.dumps(state, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict:
+    """Decode a token produced by ``encode_cursor``."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(state, dict):
+            raise TypeError("cursor payload is not an object")
+        int(state['o'])
+        str(state['p'])
+        return state
+    except Exception as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}")
@@ -0,0 +1,126 @@
+import gzip
+import json
+import logging
+import random
+import re
+import time
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Characters read from a preference file at a time
+READ_CHUNK_SIZE = 1 << 20
+
+# Profiles between two progress log lines
+PROGRESS_EVERY = 100000
+
+# Whitespace and commas between the elements of a JSON array
+_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def open_preferences(path: str):
+    """Open a preference file for reading text, decompressing ``.gz`` files."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def iter_preferences(path: str) -> Iterator[Dict]:
+    """Yield the profiles of a preference file one at a time.
+
+    Reads JSON Lines as well as a single JSON array (as written by
+    ``data_generator.py``), optionally gzip-compressed. Only one chunk of
+    the file and one profile are held in memory at a time.
+    """
+    with open_preferences(path) as f:
+        head = f.read(READ_CHUNK_SIZE)
+        start = _SEPARATORS.match(head).end()
+        if head[start:start + 1] == '[':
+            yield from _iter_json_array(f, head, start + 1)
+        else:
+            yield from _iter_json_lines(f, head)
+
+
+def _iter_json_lines(f, head: str) -> Iterator[Dict]:
+    lines = iter(f.readline, '')
+    pending = head
+    if not head.endswith('\n'):
+        pending += next(lines, '')
+    for line in pending.splitlines():
+        if line.strip():
+            yield json.loads(line)
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _iter_json_array(f, buffer: str, position: int) -> Iterator[Dict]:
+    """Decode the elements of a JSON array incrementally."""
+    decoder = json.JSONDecoder()
+    at_end = False
+    while True:
+        position = _SEPARATORS.match(buffer, position).end()
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            if position >= len(buffer):
+                raise json.JSONDecodeError("Expecting value", buffer, position)
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # The next element continues past the buffer; read on
+            if at_end:
+                raise
+            chunk = f.read(READ_CHUNK_SIZE)
+            at_end = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield value
+        position = end
+        if position > READ_CHUNK_SIZE:
+            buffer = buffer[position:]
+            position = 0
+
+
+def sample_preferences(path: str, count: int, seed: int = 0) -> List[Dict]:
+    """Uniform random sample of ``count`` profiles from a preference file.
+
+    Reservoir sampling over ``iter_preferences``: one pass, and only the
+    sample is held in memory however large the file is.
+    """
+    rng = random.Random(seed)
+    sample = []
+    for seen, profile in enumerate(iter_preferences(path)):
+        if seen < count:
+            sample.append(profile)
+        else:
+            slot = rng.randrange(seen + 1)
+            if slot < count:
+                sample[slot] = profile
+    return sample
+
+
+def batched(profiles: Iterable[Dict], batch_size: int) -> Iterator[List[Dict]]:
+    """Group profiles into lists of at most ``batch_size``."""
+    iterator = iter(profiles)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def log_progress(profiles: Iterable[Dict], every: int = PROGRESS_EVERY,
+                 label: str = "preference profiles") -> Iterator[Dict]:
+    """Pass profiles through, logging how many were read and how fast."""
+    start = time.perf_counter()
+    count = 0
+    for profile in profiles:
+        count += 1
+        if count % every == 0:
+            elapsed = time.perf_counter() - start
+            logger.info(f"Read {count} {label} ({count / elapsed:.0f}/s)")
+        yield profile
+    elapsed = time.perf_counter() - start
+    logger.info(f"Read {count} {label} in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f}/s)")
@@ -0,0 +1,205 @@
+import re
+import numpy as np
+from typing import Dict, Iterable, List
+
+from artifact import StringColumn
+from keyword_matcher import KeywordMatcher
+
+# Gender and tech indicators used to score products against a user profile
+FEMININE_INDICATORS = {'women', 'womens', 'female', 'ladies', 'feminine', 'girl'}
+MASCULINE_INDICATORS = {'men', 'mens', 'male', 'masculine', 'guy', 'boy'}
+NEUTRAL_INDICATORS = {'unisex', 'universal', 'generic'}
+TECH_INDICATORS = {'computer', 'gaming', 'electronics', 'digital', 'drive', 'ssd', 'storage', 'tech'}
+
+# Category terms used to label a match for the user
+FEMININE_CATEGORY_TERMS = ['women', 'jewelry', 'beauty']
+MASCULINE_CATEGORY_TERMS = ['men', 'masculine']
+
+# Upper bound on cached term -> products lookups
+TERM_CACHE_SIZE = 4096
+
+# Array attributes written to / read from a model artifact
+INDEX_ARRAYS = (
+    'has_feminine', 'has_masculine', 'has_neutral', 'has_tech',
+    'feminine_category', 'masculine_category',
+    'token_indptr', 'token_products',
+)
+INDEX_STRING_COLUMNS = ('categories', 'vocabulary')
+
+
+def subset_columns(positions: np.ndarray, products: np.ndarray):
+    """Column numbers of ``products`` within the ascending ``positions``.
+
+    Returns ``(columns, kept)``; only entries where ``kept`` is true are
+    in the subset.
+    """
+    columns = np.searchsorted(positions, products)
+    kept = columns < len(positions)
+    kept[kept] = positions[columns[kept]] == products[kept]
+    return columns, kept
+
+
+class ProductIndex:
+    """Normalized, precomputed view of the product catalog.
+
+    Built once when the model is trained so that the request path only has
+    to read from it instead of lowercasing and concatenating product text
+    for every product on every call.
+
+    Indicator flags are stored as boolean NumPy columns and product tokens
+    as a sparse token -> product matrix in CSR form (``token_indptr`` /
+    ``token_products``) over the sorted ``vocabulary``.
+    """
+
+    def __init__(self, products: List[Dict]):
+        self.size = len(products)
+        self.categories = []
+
+        # One pass per text finds every indicator
+        text_matcher = KeywordMatcher(
+            FEMININE_INDICATORS | MASCULINE_INDICATORS | NEUTRAL_INDICATORS | TECH_INDICATORS
+        )
+        category_matcher = KeywordMatcher(FEMININE_CATEGORY_TERMS + MASCULINE_CATEGORY_TERMS)
+
+        has_feminine = []
+        has_masculine = []
+        has_neutral = []
+        has_tech = []
+        feminine_category = []
+        masculine_category = []
+        postings = {}
+
+        for i, product in enumerate(products):
+            title = product.get('title', '').lower()
+            category = product.get('category', '').lower()
+            description = product.get('description', '').lower()
+            product_text = f"{title} {description} {category}"
+
+            self.categories.append(category)
+            for token in set(product_text.split()):
+                postings.setdefault(token, []).append(i)
+
+            # Indicator flags keep the substring semantics of the scorer
+            hits = text_matcher.find(product_text)
+            has_feminine.append(not hits.isdisjoint(FEMININE_INDICATORS))
+            has_masculine.append(not hits.isdisjoint(MASCULINE_INDICATORS))
+            has_neutral.append(not hits.isdisjoint(NEUTRAL_INDICATORS))
+            has_tech.append(not hits.isdisjoint(TECH_INDICATORS))
+
+            category_hits = category_matcher.find(category)
+            feminine_category.append(not category_hits.isdisjoint(FEMININE_CATEGORY_TERMS))
+            masculine_category.append(not category_hits.isdisjoint(MASCULINE_CATEGORY_TERMS))
+
+        self.has_feminine = np.array(has_feminine, dtype=bool)
+        self.has_masculine = np.array(has_masculine, dtype=bool)
+        self.has_neutral = np.array(has_neutral, dtype=bool)
+        self.has_tech = np.array(has_tech, dtype=bool)
+        self.feminine_category = np.array(feminine_category, dtype=bool)
+        self.masculine_category = np.array(masculine_category, dtype=bool)
+
+        # Sparse token -> product matrix
+        vocabulary = sorted(postings)
+        lengths = np.array([len(postings[token]) for token in vocabulary], dtype=np.int64)
+        self.token_indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.token_indptr[1:])
+        self.token_products = np.array(
+            [i for token in vocabulary for i in postings[token]], dtype=np.int32
+        )
+        self.vocabulary = StringColumn.from_strings(vocabulary)
+
+        self._term_cache = {}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'ProductIndex':
+        """Rebuild an index from the arrays written by ``to_arrays``."""
+        index = cls.__new__(cls)
+        for name in INDEX_ARRAYS:
+            setattr(index, name, arrays[f'index.{name}'])
+        for name in INDEX_STRING_COLUMNS:
+            setattr(index, name, StringColumn(arrays[f'index.{name}.data'], arrays[f'index.{name}.offsets']))
+        index.size = len(index.has_feminine)
+        index._term_cache = {}
+        return index
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Flat arrays describing the index, for saving in a model artifact."""
+        arrays = {f'index.{name}': getattr(self, name) for name in INDEX_ARRAYS}
+        for name in INDEX_STRING_COLUMNS:
+            column = getattr(self, name)
+            if not isinstance(column, StringColumn):
+                column = StringColumn.from_strings(column)
+            arrays[f'index.{name}.data'] = column.data
+            arrays[f'index.{name}.offsets'] = column.offsets
+        return arrays
+
+    def __len__(self):
+        return self.size
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_term_cache'] = {}
+        return state
+
+    def resolve_terms(self, terms: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Map each term to the sorted indices of products containing it.
+
+        Terms must not contain whitespace. Since product text is the
+        whitespace-joined token list, a substring match always falls inside
+        a single token, so only the vocabulary has to be searched. Terms not
+        yet cached are searched for in the UTF-8 bytes of the vocabulary
+        column, which stay a shared mapping of the artifact instead of being
+        copied into each process.
+        """
+        resolved = {}
+        missing = []
+        for term in set(terms):
+            cached = self._term_cache.get(term)
+            if cached is not None:
+                resolved[term] = cached
+            else:
+                missing.append(term)
+        if not missing:
+            return resolved
+
+        if len(self._term_cache) + len(missing) > TERM_CACHE_SIZE:
+            self._term_cache.clear()
+        for term in missing:
+            token_ids = self._matching_tokens(term.encode('utf-8'))
+            if not len(token_ids):
+                result = np.empty(0, dtype=np.int32)
+            elif len(token_ids) == 1:
+                j = token_ids[0]
+                result = self.token_products[self.token_indptr[j]:self.token_indptr[j + 1]]
+            else:
+                result = np.unique(np.concatenate([
+                    self.token_products[self.token_indptr[j]:self.token_indptr[j + 1]]
+                    for j in token_ids
+                ]))
+            self._term_cache[term] = result
+            resolved[term] = result
+        return resolved
+
+    def _matching_tokens(self, keyword: bytes) -> np.ndarray:
+        """Ids of the vocabulary tokens containing ``keyword``, ascending.
+
+        The search itself runs in C via ``re``; Python only steps from one
+        matching token to the next. Tokens are stored back to back, so a
+        match that runs past the end of its token is skipped by one byte
+        instead of a whole token.
+        """
+        if not keyword:
+            return np.empty(0, dtype=np.int64)
+        offsets = self.vocabulary.offsets
+        data = memoryview(self.vocabulary.data)
+        search = re.compile(re.escape(keyword)).search
+        token_ids = []
+        match = search(data)
+        while match is not None:
+            token_id = int(np.searchsorted(offsets, match.start(), side='right')) - 1
+            token_end = int(offsets[token_id + 1])
+            if match.end() <= token_end:
+                token_ids.append(token_id)
+                match = search(data, token_end)
+            else:
+                match = search(data, match.start() + 1)
+        return np.array(token_ids, dtype=np.int64)
@@ -0,0 +1,102 @@
+import logging
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Directory profiled requests are written to, one file per request
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+# Share of matching requests profiled without being asked (0 disables)
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+
+
+def new_profile_path(route: str) -> str:
+    """Unique file for the profile of one request on ``route``."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    timestamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    return os.path.join(PROFILE_DIR, f"{route}-{timestamp}-{uuid.uuid4().hex[:8]}.folded")
+
+
+def _code_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _builtin_label(function) -> str:
+    name = getattr(function, '__qualname__', None) or repr(function)
+    module = getattr(function, '__module__', None)
+    return f"{module}.{name}" if module else name
+
+
+class StackProfiler:
+    """Deterministic profiler recording time per full call stack.
+
+    Unlike cProfile, which only keeps caller/callee pairs, every stack is
+    kept whole, so the output can be drawn as a flamegraph directly. Only
+    the thread that calls ``start`` is profiled.
+    """
+
+    def __init__(self, root: str):
+        self.root = (root,)
+        self.stacks: Dict[Tuple[str, ...], float] = {}
+        self._stack = [self.root]
+        self._last = 0.0
+
+    def start(self):
+        self._last = time.perf_counter()
+        sys.setprofile(self._callback)
+
+    def stop(self):
+        sys.setprofile(None)
+        self._charge(time.perf_counter())
+
+    def _charge(self, now: float):
+        stack = self._stack[-1]
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + now - self._last
+
+    def _callback(self, frame, event, arg):
+        self._charge(time.perf_counter())
+        if event == 'call':
+            self._stack.append(self._stack[-1] + (_code_label(frame.f_code),))
+        elif event == 'c_call':
+            self._stack.append(self._stack[-1] + (_builtin_label(arg),))
+        elif len(self._stack) > 1:
+            # 'return', 'c_return' or 'c_exception'; returns from frames
+            # entered before start() find only the root left
+            self._stack.pop()
+        # The profiler's own bookkeeping is not charged to the code
+        self._last = time.perf_counter()
+
+    def write(self, path: str):
+        """Write collapsed stacks, one ``frame;frame;... microseconds`` per line.
+
+        This is the input format of flamegraph.pl, inferno and speedscope.
+        """
+        with open(path, 'w') as f:
+            for stack, seconds in sorted(self.stacks.items()):
+                microseconds = int(seconds * 1_000_000)
+                if microseconds:
+                    f.write(f"{';'.join(stack)} {microseconds}\n")
+
+
+@contextmanager
+def profiled(path: Optional[str], root: str = 'request'):
+    """Profile the block into ``path``; does nothing when ``path`` is None."""
+    if path is None:
+        yield
+        return
+    profiler = StackProfiler(root)
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        try:
+            profiler.write(path)
+            logger.info(f"Wrote profile to {path}")
+        except OSError as e:
+            logger.error(f"Could not write profile to {path}: {e}")
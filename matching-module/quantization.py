@@ -0,0 +1,186 @@
+import argparse
+import json
+import logging
+import os
+import numpy as np
+from typing import Dict, List, Optional
+
+from artifact import DEFAULT_ARTIFACT_DIR
+from preference_loader import sample_preferences
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DTYPES = ('float32', 'float16', 'int8')
+
+# Rows converted to float32 at a time while scoring
+SCORE_BLOCK_ROWS = 65536
+
+
+class EmbeddingStore:
+    """Product embedding matrix stored as float32, float16 or int8.
+
+    int8 storage keeps one float32 scale per vector (``x ~ q * scale``).
+    Similarities are computed directly from the stored rows, block by
+    block, so only one block is ever widened to float32.
+    """
+
+    def __init__(self, data: np.ndarray, scales: Optional[np.ndarray] = None):
+        self.data = data
+        self.scales = scales
+        self.dtype = str(data.dtype)
+        if self.dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unsupported embedding dtype: {self.dtype}")
+        if self.dtype == 'int8' and scales is None:
+            raise ValueError("int8 embeddings need per-vector scales")
+
+    @classmethod
+    def quantize(cls, embeddings: np.ndarray, dtype: str = 'float32') -> 'EmbeddingStore':
+        """Convert a float embedding matrix to the requested storage dtype."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if dtype == 'float32':
+            return cls(np.ascontiguousarray(embeddings))
+        if dtype == 'float16':
+            return cls(embeddings.astype(np.float16))
+        if dtype == 'int8':
+            scales = np.abs(embeddings).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            data = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+            return cls(data, scales.astype(np.float32))
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, rows) -> np.ndarray:
+        """Return the selected rows as float32 vectors."""
+        block = np.asarray(self.data[rows], dtype=np.float32)
+        if self.scales is not None:
+            scales = np.asarray(self.scales[rows], dtype=np.float32)
+            block = block * (scales[..., None] if block.ndim > 1 else scales)
+        return block
+
+    def similarity(self, queries: np.ndarray, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Dot products of each query row with every (or each selected) vector."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if positions is not None:
+            return queries @ self[positions].T
+
+        result = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK_ROWS):
+            stop = min(start + SCORE_BLOCK_ROWS, len(self))
+            block = np.asarray(self.data[start:stop], dtype=np.float32)
+            result[:, start:stop] = queries @ block.T
+            if self.scales is not None:
+                result[:, start:stop] *= self.scales[start:stop]
+        return result
+
+    def save(self, path: str) -> str:
+        """Write the matrix (and int8 scales) as .npy files."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.save(path, self.data)
+        if self.scales is not None:
+            np.save(scales_path(path), self.scales)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'EmbeddingStore':
+        """Memory-map a saved matrix read-only."""
+        data = np.load(path, mmap_mode='r')
+        scales = None
+        if data.dtype == np.int8:
+            scales = np.load(scales_path(path), mmap_mode='r')
+            if len(scales) != len(data):
+                raise ValueError(f"Scale file for {path} does not match the embeddings")
+        return cls(data, scales)
+
+
+def scales_path(path: str) -> str:
+    """Path of the per-vector scale file belonging to an int8 matrix."""
+    root, _ = os.path.splitext(path)
+    return f"{root}.scales.npy"
+
+
+def top_k_overlap(reference: np.ndarray, candidate: np.ndarray, k: int = 10) -> float:
+    """Mean share of each row's reference top-k found in the candidate top-k."""
+    k = min(k, reference.shape[1])
+    overlaps = []
+    for ref_row, cand_row in zip(reference, candidate):
+        ref_top = set(np.argpartition(-ref_row, k - 1)[:k].tolist())
+        cand_top = set(np.argpartition(-cand_row, k - 1)[:k].tolist())
+        overlaps.append(len(ref_top & cand_top) / k)
+    return float(np.mean(overlaps)) if overlaps else 0.0
+
+
+def accuracy_report(model, preferences: List[Dict], k: int = 10) -> List[Dict]:
+    """Compare quantized storage against float32 for a trained semantic model.
+
+    Reports top-k overlap of raw similarities and of the final
+    recommendations, plus the bytes each storage dtype needs. The model
+    should have been trained with float32 embeddings, which serve as the
+    reference.
+    """
+    original = model.product_embeddings
+    full = EmbeddingStore.quantize(original[np.arange(len(original))], 'float32')
+    profiles = [model._analyze_user_profile(prefs) for prefs in preferences]
+    queries = model.encoder.encode([profile['semantic_text'] for profile in profiles])
+    reference_sims = full.similarity(queries)
+
+    def recommendation_ids(store):
+        model.product_embeddings = store
+        model.ranking_cache.clear()
+        return [
+            [rec['id'] for rec in model.get_recommendation_page(prefs, 1, k)[0]]
+            for prefs in preferences
+        ]
+
+    report = []
+    try:
+        reference_recs = recommendation_ids(full)
+        for dtype in EMBEDDING_DTYPES:
+            store = EmbeddingStore.quantize(full.data, dtype)
+            recs = recommendation_ids(store)
+            rec_overlap = np.mean([
+                len(set(a) & set(b)) / max(len(a), 1) for a, b in zip(reference_recs, recs)
+            ])
+            report.append({
+                'dtype': dtype,
+                'bytes': store.nbytes,
+                'memoryReduction': round(full.nbytes / store.nbytes, 2),
+                f'similarityOverlap@{k}': round(top_k_overlap(reference_sims, store.similarity(queries), k), 4),
+                f'recommendationOverlap@{k}': round(float(rec_overlap), 4),
+            })
+    finally:
+        model.product_embeddings = original
+        model.ranking_cache.clear()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure quantized embedding accuracy against float32")
+    parser.add_argument('--model', default=DEFAULT_ARTIFACT_DIR)
+    parser.add_argument('--preferences', default='data/production_preferences.json',
+                        help="profiles to compare on (.json or .jsonl, optionally .gz)")
+    parser.add_argument('--profiles', type=int, default=500)
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    from model import ProductRecommender
+    model = ProductRecommender.load(args.model)
+    if model.product_embeddings is None:
+        raise SystemExit("Model was trained without embeddings (set semantic_weight)")
+
+    preferences = sample_preferences(args.preferences, args.profiles)
+    print(json.dumps(accuracy_report(model, preferences, k=args.k), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from artifact import ArtifactError, ArtifactReader
+from model import ProductRecommender
+from scoring_pool import ScoringPool
+
+logger = logging.getLogger(__name__)
+
+# Profile scored on a new model before it starts serving
+WARMUP_PREFERENCES = {
+    "interests": "general",
+    "wishlist": "",
+    "gender": "prefer not to say",
+}
+
+
+class ServingModel:
+    """A loaded model together with the pool that scores with it.
+
+    Requests take the current ``ServingModel`` once and use it throughout,
+    so a reload never changes the model under a request in flight.
+    """
+
+    def __init__(self, model: ProductRecommender, pool: ScoringPool):
+        self.model = model
+        self.pool = pool
+        self.loaded_at = time.time()
+
+    @property
+    def model_version(self) -> str:
+        return self.model.model_version or 'unsaved'
+
+    @property
+    def catalog_version(self) -> str:
+        return self.model.catalog_version
+
+
+class ModelReloader:
+    """Loads the model in the background and swaps it in when it changes.
+
+    ``load_model(products)`` must return a ready ``ProductRecommender``;
+    given products it has to make sure the model was trained on them.
+    ``create_pool(model)`` builds the scoring pool for a model.
+
+    Every ``watch_interval`` seconds the reloader checks whether the
+    artifact on disk was replaced (e.g. by ``train.py`` or another worker)
+    and, when ``rebuild_on_catalog_change`` is set, whether the fetched
+    catalog differs from the one the model was trained on. A new model is
+    loaded and warmed up next to the current one, then swapped in with a
+    single assignment; the old pool finishes its queued calls and stops.
+    """
+
+    def __init__(self, load_model: Callable[[Optional[List[Dict]]], ProductRecommender],
+                 create_pool: Callable[[ProductRecommender], ScoringPool],
+                 artifact_path: str, data_fetcher=None, watch_interval: float = 30.0,
+                 rebuild_on_catalog_change: bool = True):
+        self.load_model = load_model
+        self.create_pool = create_pool
+        self.artifact_path = artifact_path
+        self.data_fetcher = data_fetcher
+        self.watch_interval = watch_interval
+        self.rebuild_on_catalog_change = rebuild_on_catalog_change
+        self.current = None
+        self.last_error = None
+        self.reload_count = 0
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._seen_catalog_version = None
+
+    def start(self):
+        """Load the first model in the background, then keep watching for changes."""
+        if self.data_fetcher is not None:
+            self._seen_catalog_version = self.data_fetcher.catalog_version
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.current is not None:
+            self.current.pool.shutdown()
+
+    async def reload(self, rebuild: bool = False) -> Optional[ServingModel]:
+        """Load (or with ``rebuild``, retrain on the current catalog) and swap.
+
+        Returns the model now serving. On failure the previous model keeps
+        serving and the error is kept in ``last_error``.
+        """
+        async with self._lock:
+            products = None
+            if rebuild:
+                products = self.data_fetcher.get_products() if self.data_fetcher else None
+                if not products:
+                    self.last_error = "No catalog available to rebuild the model from"
+                    logger.error(self.last_error)
+                    return self.current
+
+            pool = None
+            try:
+                model = await asyncio.to_thread(self.load_model, products)
+                pool = self.create_pool(model)
+                await pool.start()
+                # One throwaway request builds the lazily initialized lookup tables
+                await pool.run('get_recommendation_page', WARMUP_PREFERENCES, 1, 6, None)
+                model.ranking_cache.clear()
+            except Exception as e:
+                logger.exception("Model reload failed")
+                if pool is not None:
+                    pool.shutdown()
+                self.last_error = str(e)
+                return self.current
+
+            previous, self.current = self.current, ServingModel(model, pool)
+            self.last_error = None
+            self.reload_count += 1
+            logger.info(f"Serving model {self.current.model_version} "
+                        f"(catalog {self.current.catalog_version})")
+            if previous is not None:
+                # Requests already holding the old pool finish on it
+                await asyncio.to_thread(previous.pool.shutdown, True, False)
+            return self.current
+
+    def _artifact_changed(self) -> bool:
+        current = self.current
+        if current is None or current.model.artifact_path is None:
+            return False
+        try:
+            created_at = ArtifactReader(self.artifact_path).manifest['createdAt']
+        except ArtifactError:
+            # Missing or half-replaced; keep serving what we have
+            return False
+        return created_at != current.model.artifact_created_at
+
+    def _catalog_changed(self) -> bool:
+        if not self.rebuild_on_catalog_change or self.data_fetcher is None or self.current is None:
+            return False
+        version = self.data_fetcher.catalog_version
+        if version is None or version == self._seen_catalog_version:
+            return False
+        self._seen_catalog_version = version
+        return version != self.current.catalog_version
+
+    async def _watch(self):
+        await self.reload()
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                if self.current is None:
+                    # The first load failed; keep trying
+                    await self.reload()
+                elif await asyncio.to_thread(self._catalog_changed):
+                    logger.info("Catalog changed, rebuilding the model")
+                    await self.reload(rebuild=True)
+                elif await asyncio.to_thread(self._artifact_changed):
+                    logger.info("Model artifact changed, reloading")
+                    await self.reload()
+            except Exception:
+                logger.exception("Model watcher failed")
@@ -1,9 +1,28 @@
-from fastapi import APIRouter, HTTPException, Query, Request
+import functools
+import os
+import random
+import secrets
+import time
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import Dict, List, Optional
+from metrics import ERRORS, REGISTRY, REQUEST_SECONDS, REQUESTS, STAGE_SECONDS
+from pagination import InvalidCursorError
+from profiling import PROFILE_SAMPLE_RATE, new_profile_path
+from scoring_pool import PoolSaturatedError
 
 router = APIRouter()
 
+# Largest number of profiles accepted by /match-products/batch
+MAX_BATCH_SIZE = 200
+
+# Seconds a client is asked to wait when the scoring pool is full
+SATURATED_RETRY_AFTER = 1
+
+# Share of matching requests whose details are logged (errors always are)
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', '0.01'))
+
 class Preferences(BaseModel):
     interests: Optional[str] = ""
     sizes: Optional[Dict[str, str]] = {}
@@ -15,39 +34,269 @@ class Preferences(BaseModel):
     stylePreference: Optional[str] = None
     sustainability: Optional[str] = None
 
+class BatchPreferences(BaseModel):
+    preferences: List[Preferences]
+
+def _instrumented(route: str):
+    """Record latency and final status of a matching route."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            status = 500
+            try:
+                result = await handler(*args, **kwargs)
+                status = 200
+                return result
+            except HTTPException as e:
+                status = e.status_code
+                raise
+            finally:
+                REQUEST_SECONDS.observe(time.perf_counter() - start, route=route)
+                REQUESTS.inc(route=route, status=status)
+        return wrapper
+    return decorator
+
+def _log_sampled() -> bool:
+    """Whether to log the details of this request."""
+    return REQUEST_LOG_SAMPLE_RATE >= 1 or random.random() < REQUEST_LOG_SAMPLE_RATE
+
+def _fetch_products(request: Request, route: str):
+    """Current catalog, or 503 if none has been loaded yet."""
+    start = time.perf_counter()
+    products = request.app.state.data_fetcher.get_products()
+    STAGE_SECONDS.observe(time.perf_counter() - start, stage='catalog_fetch')
+    if not products:
+        ERRORS.inc(route=route, error='CatalogUnavailable')
+        raise HTTPException(status_code=503, detail="Product catalog unavailable")
+    return products
+
+def _saturated(error: PoolSaturatedError, route: str) -> HTTPException:
+    """503 telling the client to back off while scoring is saturated."""
+    ERRORS.inc(route=route, error='PoolSaturated')
+    if _log_sampled():
+        print("Scoring pool saturated:", error)
+    return HTTPException(
+        status_code=503,
+        detail="Matching service is busy, please retry",
+        headers={'Retry-After': str(SATURATED_RETRY_AFTER)}
+    )
+
+def _serving(request: Request, route: str):
+    """Model currently serving, or 503 while the first one is still loading."""
+    serving = request.app.state.reloader.current
+    if serving is None:
+        ERRORS.inc(route=route, error='NotReady')
+        raise HTTPException(
+            status_code=503,
+            detail="Matching service is starting up",
+            headers={'Retry-After': str(SATURATED_RETRY_AFTER)}
+        )
+    return serving
+
+def _is_admin(x_admin_token: Optional[str]) -> bool:
+    """Whether the request carries ``ADMIN_TOKEN``; never true when it is unset."""
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    return bool(admin_token) and secrets.compare_digest(x_admin_token or '', admin_token)
+
+def _profile_path(route: str, response: Response, x_profile: Optional[str],
+                  x_admin_token: Optional[str]) -> Optional[str]:
+    """Where to write this request's profile, or None to not profile it.
+    
+    Admins ask for a profile with ``X-Profile: 1`` and get the file name back
+    in the same header; ``PROFILE_SAMPLE_RATE`` profiles a share of all
+    requests.
+    """
+    if x_profile:
+        if not _is_admin(x_admin_token):
+            raise HTTPException(status_code=403, detail="Admin token required for profiling")
+        path = new_profile_path(route)
+        response.headers['X-Profile'] = os.path.basename(path)
+        return path
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return new_profile_path(route)
+    return None
+
+def _set_version_headers(response: Response, serving):
+    """Tell the client which model and catalog produced the response."""
+    response.headers['X-Model-Version'] = serving.model_version
+    response.headers['X-Catalog-Version'] = serving.catalog_version
+
 @router.post("/match-products")
+@_instrumented('match-products')
 async def match_products(
     request: Request,
+    response: Response,
     preferences: Preferences,
     page: int = Query(1, ge=1),
-    pageSize: int = Query(6, ge=1, le=50)
+    pageSize: int = Query(6, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)
 ):
-    """Match products based on user preferences."""
-    print("Received preferences:", preferences)
+    """Match products based on user preferences.
+    
+    The response body is the list of recommendations for the page. When more
+    results may follow, the ``X-Next-Cursor`` header carries an opaque cursor
+    that can be passed back as ``cursor`` to fetch the next page.
+    """
+    route = 'match-products'
+    profile_path = _profile_path(route, response, x_profile, x_admin_token)
+    log_request = _log_sampled()
+    if log_request:
+        print("Received preferences:", preferences)
     try:
+        # Held for the whole request, so a reload cannot swap it midway
+        serving = _serving(request, route)
+        
         # Get products
-        products = request.app.state.data_fetcher.get_products()
-        if not products:
-            raise HTTPException(status_code=500, detail="Failed to fetch products")
-        print("Fetched products:", len(products))
+        products = _fetch_products(request, route)
+        if log_request:
+            print("Fetched products:", len(products))
         
-        # Convert preferences to dict and add pagination
+        # Convert preferences to dict
         prefs_dict = preferences.dict()
-        prefs_dict['page'] = page
-        prefs_dict['pageSize'] = pageSize
         
         # Get recommendations
         try:
-            recommendations = request.app.state.model.get_recommendations(products, prefs_dict)
-            print("Got recommendations:", len(recommendations))
+            recommendations, next_cursor = await serving.pool.run(
+                'get_recommendation_page', prefs_dict, page, pageSize, cursor,
+                profile_path=profile_path
+            )
+            if log_request:
+                print("Got recommendations:", len(recommendations))
+            _set_version_headers(response, serving)
+            if next_cursor:
+                response.headers['X-Next-Cursor'] = next_cursor
             return recommendations
+        except InvalidCursorError as e:
+            ERRORS.inc(route=route, error='InvalidCursor')
+            raise HTTPException(status_code=400, detail=str(e))
+        except PoolSaturatedError as e:
+            raise _saturated(e, route)
         except Exception as e:
             import traceback
+            ERRORS.inc(route=route, error=type(e).__name__)
             print("Error getting recommendations:")
             print(traceback.format_exc())
             raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
+        ERRORS.inc(route=route, error=type(e).__name__)
         print("Error in match_products:")
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/match-products/batch")
+@_instrumented('match-products-batch')
+async def match_products_batch(
+    request: Request,
+    response: Response,
+    batch: BatchPreferences,
+    page: int = Query(1, ge=1),
+    pageSize: int = Query(6, ge=1, le=50),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Match products for several participants' preferences in one call.
+    
+    Returns one list of recommendations per entry in ``preferences``, in the
+    same order.
+    """
+    route = 'match-products-batch'
+    if len(batch.preferences) > MAX_BATCH_SIZE:
+        ERRORS.inc(route=route, error='BatchTooLarge')
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_BATCH_SIZE} preference profiles per batch"
+        )
+    profile_path = _profile_path(route, response, x_profile, x_admin_token)
+    log_request = _log_sampled()
+    if log_request:
+        print("Received batch of preferences:", len(batch.preferences))
+    try:
+        serving = _serving(request, route)
+        _fetch_products(request, route)
+        
+        prefs_list = [preferences.dict() for preferences in batch.preferences]
+        results = await serving.pool.run(
+            'get_batch_recommendations', prefs_list, page, pageSize,
+            profile_path=profile_path
+        )
+        if log_request:
+            print("Got batch recommendations:", len(results))
+        _set_version_headers(response, serving)
+        return results
+    except HTTPException:
+        raise
+    except PoolSaturatedError as e:
+        raise _saturated(e, route)
+    except Exception as e:
+        import traceback
+        ERRORS.inc(route=route, error=type(e).__name__)
+        print("Error in match_products_batch:")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/cache-stats")
+async def cache_stats(request: Request):
+    """Report ranking cache counters for sizing the cache.
+    
+    In process scoring mode each worker keeps its own cache; these are the
+    counters of the copy held by the serving process.
+    """
+    return _serving(request, 'cache-stats').model.ranking_cache.stats()
+
+@router.get("/ready")
+async def ready(request: Request, response: Response):
+    """Readiness probe: 200 once the model is warm and a catalog is loaded."""
+    reloader = request.app.state.reloader
+    serving = reloader.current
+    catalog_loaded = bool(request.app.state.data_fetcher.get_products())
+    status = {
+        'ready': serving is not None and catalog_loaded,
+        'modelLoaded': serving is not None,
+        'catalogLoaded': catalog_loaded,
+        'fetchedCatalogVersion': request.app.state.data_fetcher.catalog_version,
+    }
+    if serving is not None:
+        status['modelVersion'] = serving.model_version
+        status['catalogVersion'] = serving.catalog_version
+    if reloader.last_error:
+        status['error'] = reloader.last_error
+    if not status['ready']:
+        response.status_code = 503
+    return status
+
+@router.post("/admin/reload")
+async def reload_model(
+    request: Request,
+    rebuild: bool = Query(False),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Load the latest model artifact and swap it in without a restart.
+    
+    With ``rebuild=true`` the model is first retrained on the catalog the
+    service currently holds. Requests in flight finish on the old model.
+    Requires the ``X-Admin-Token`` header to match ``ADMIN_TOKEN``; the
+    endpoint is disabled when no token is configured.
+    """
+    if not _is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    
+    reloader = request.app.state.reloader
+    serving = await reloader.reload(rebuild=rebuild)
+    if reloader.last_error:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {reloader.last_error}")
+    return {
+        'modelVersion': serving.model_version,
+        'catalogVersion': serving.catalog_version,
+        'reloads': reloader.reload_count,
+    }
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of this worker's matcher metrics."""
+    return PlainTextResponse(REGISTRY.render(), media_type='text/plain; version=0.0.4')
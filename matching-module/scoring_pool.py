@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from metrics import collect_stages, record_stages
+from profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+SCORING_MODES = ('inline', 'thread', 'process')
+
+# Model held by each process-pool worker, set once by _init_worker
+_worker_model = None
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when a scoring call arrives while the pool is full or shut down."""
+
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+def _timed_call(model, method: str, args: tuple, submitted_at: float,
+                profile_path: Optional[str] = None):
+    """Call the model and return its result with the stage timings of the call.
+
+    With ``profile_path`` the call is also profiled into that file.
+    """
+    queued = time.time() - submitted_at
+    with collect_stages() as timings:
+        if profile_path is None:
+            result = getattr(model, method)(*args)
+        else:
+            with profiled(profile_path, root=method):
+                result = getattr(model, method)(*args)
+    timings['queue'] = queued
+    return result, timings
+
+
+def _call_worker_model(method: str, args: tuple, submitted_at: float,
+                       profile_path: Optional[str] = None):
+    return _timed_call(_worker_model, method, args, submitted_at, profile_path)
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+class ScoringPool:
+    """Runs ProductRecommender calls off the event loop.
+
+    ``mode`` selects where scoring runs:
+
+    - ``'inline'``: on the calling thread (blocks the event loop)
+    - ``'thread'``: in a thread pool sharing the model; the NumPy kernels
+      release the GIL for most of the work
+    - ``'process'``: in a process pool whose workers each receive a copy
+      of the model once at startup, so the pure-Python parts of scoring
+      scale with cores too
+
+    At most ``max_pending`` calls may be running or queued at once; further
+    calls fail immediately with ``PoolSaturatedError`` instead of piling up
+    behind a saturated pool. So do calls arriving after ``shutdown``, rather
+    than falling back to scoring on the event loop.
+    """
+
+    def __init__(self, model, mode: str = 'thread', max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None):
+        if mode not in SCORING_MODES:
+            raise ValueError(f"Unknown scoring mode: {mode}")
+        self.model = model
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._executor = None
+        if mode == 'thread':
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='scoring'
+            )
+        elif mode == 'process':
+            # Spawned rather than forked: the parent runs threads (event
+            # loop, thread pools) that must not be copied mid-operation
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(model,),
+            )
+        logger.info(f"Scoring in {mode} mode with {self.max_workers} workers, "
+                    f"at most {self.max_pending} pending calls")
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def start(self):
+        """Start every process-pool worker so none loads the model mid-request."""
+        if self.mode != 'process':
+            return
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*[
+            loop.run_in_executor(self._executor, _worker_pid) for _ in range(self.max_workers)
+        ])
+        logger.info(f"Started {len(set(pids))} scoring worker processes")
+
+    async def run(self, method: str, *args, profile_path: Optional[str] = None):
+        """Call ``model.<method>(*args)`` in the pool and await the result.
+
+        Given ``profile_path``, the call is profiled by the worker running it
+        and the collapsed stacks are written to that file.
+        """
+        with self._lock:
+            if self._closed:
+                raise PoolSaturatedError("Scoring pool is shut down")
+            if self._pending >= self.max_pending:
+                raise PoolSaturatedError(
+                    f"{self._pending} scoring calls pending (limit {self.max_pending})"
+                )
+            self._pending += 1
+            executor = self._executor
+        try:
+            submitted_at = time.time()
+            if executor is None:
+                result, timings = _timed_call(self.model, method, args, submitted_at, profile_path)
+            else:
+                if self.mode == 'process':
+                    call = (_call_worker_model, method, args, submitted_at, profile_path)
+                else:
+                    call = (_timed_call, self.model, method, args, submitted_at, profile_path)
+                try:
+                    future = asyncio.get_running_loop().run_in_executor(executor, *call)
+                except RuntimeError:
+                    # Shut down between the check above and submitting
+                    raise PoolSaturatedError("Scoring pool is shut down")
+                result, timings = await future
+            # Timings cross the process boundary with the result
+            record_stages(timings)
+            return result
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = True):
+        """Stop the workers; with ``cancel_pending=False`` queued calls still finish.
+
+        Calls made afterwards raise ``PoolSaturatedError``.
+        """
+        with self._lock:
+            self._closed = True
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=cancel_pending)
@@ -0,0 +1,39 @@
+import os
+import sys
+import pytest
+
+# The matcher modules import each other by bare name, like main.py does
+MODULE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MODULE_DIR)
+sys.path.insert(1, os.path.join(MODULE_DIR, 'benchmarks'))
+
+from data_generator import ProductionPreferenceGenerator
+from model import ProductRecommender
+from synthetic import synthetic_catalog
+
+
+@pytest.fixture(scope='session')
+def model(tmp_path_factory):
+    """Recommender trained on a small synthetic catalog, loaded from its artifact."""
+    work_dir = tmp_path_factory.mktemp('model')
+    cwd = os.getcwd()
+    # Keep data/ lookups of the checkout out of the tests
+    os.chdir(work_dir)
+    try:
+        artifact_path = str(work_dir / 'artifact')
+        ProductRecommender().train(synthetic_catalog(2000, seed=1), {}, artifact_path)
+        return ProductRecommender.load(artifact_path)
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture(scope='session')
+def profiles():
+    """Generated preference profiles plus a few hand-written edge cases."""
+    return ProductionPreferenceGenerator(seed=3).generate_production_preferences(60) + [
+        {'interests': 'hiking, camping, gaming', 'gender': 'male'},
+        {'interests': 'yoga fashion', 'gender': 'female'},
+        {'interests': 'pink princess glitter'},
+        {'interests': ''},
+        {},
+    ]
@@ -0,0 +1,57 @@
+import numpy as np
+
+from affinity import AffinityBuilder, AffinityTable, interest_terms
+from product_index import ProductIndex
+
+PRODUCTS = [
+    {'id': 1, 'title': 'Hiking boots', 'description': 'Waterproof boots', 'category': 'Outdoors'},
+    {'id': 2, 'title': 'Camping tent', 'description': 'Two person tent', 'category': 'Outdoors'},
+    {'id': 3, 'title': 'Desk lamp', 'description': 'LED lamp', 'category': 'Outdoors'},
+]
+
+INTERESTS = ['hiking, camping', 'camping, hiking', 'hiking camping,', 'reading lamps', 'camping']
+
+
+def build_table():
+    builder = AffinityBuilder()
+    builder.add_batch([{'interests': INTERESTS[i % len(INTERESTS)]} for i in range(500)])
+    groups = [{'hiking': 1.0, 'camping': 1.0, 'outdoors': 1.0}]
+    return builder.build(ProductIndex(PRODUCTS), groups), ProductIndex(PRODUCTS)
+
+
+def test_stated_interest_outranks_related_interest():
+    table, index = build_table()
+    for text in INTERESTS[:3] + ['hiking', 'camping.', '(hiking)']:
+        terms = interest_terms(text)
+        scores = table.sum_batch([terms], index)[0]
+        for term in terms:
+            key = term.strip(',.()')
+            containing = [i for i, p in enumerate(PRODUCTS) if key in p['title'].lower()]
+            related_only = [i for i in range(len(PRODUCTS)) if i not in containing and scores[i] > 0]
+            for i in containing:
+                for j in related_only:
+                    assert scores[i] >= scores[j], (text, PRODUCTS[i]['title'], PRODUCTS[j]['title'])
+
+
+def test_punctuated_term_has_full_affinity_to_its_interest():
+    table, index = build_table()
+    products, weights = table.lookup(['hiking,'], index)['hiking,']
+    np.testing.assert_array_equal(weights[products == 0], [1.0])
+    assert (weights[products != 0] < 1.0).all()
+
+
+def test_rebuild_carries_relations_to_a_new_catalog():
+    table, _ = build_table()
+    arrays = {name: np.asarray(array) for name, array in table.to_arrays().items()}
+    products = PRODUCTS[::-1] + [{'id': 4, 'title': 'Camping stove', 'description': '', 'category': 'Outdoors'}]
+    index = ProductIndex(products)
+    rebuilt = AffinityTable.from_arrays(arrays).rebuild(index)
+
+    builder = AffinityBuilder()
+    builder.add_batch([{'interests': INTERESTS[i % len(INTERESTS)]} for i in range(500)])
+    expected = builder.build(index, [{'hiking': 1.0, 'camping': 1.0, 'outdoors': 1.0}])
+    assert list(rebuilt.terms) == list(expected.terms)
+    for name in ('indptr', 'products', 'weights', 'related_indptr', 'related_strengths'):
+        np.testing.assert_array_equal(getattr(rebuilt, name), getattr(expected, name))
+    hiking = rebuilt.lookup(['hiking'], index)['hiking']
+    assert 3 in hiking[0] and 0 < hiking[1][list(hiking[0]).index(3)] < 1
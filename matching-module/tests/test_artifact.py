@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+
+import artifact
+from artifact import ArtifactReader, ArtifactWriter
+
+
+def publish(path, size):
+    writer = ArtifactWriter(path)
+    writer.add_array('values', np.arange(size, dtype=np.int64))
+    writer.add_json('info', {'size': size})
+    writer.commit({'size': size})
+
+
+def test_reader_keeps_its_version_across_publishes(tmp_path):
+    path = str(tmp_path / 'artifact')
+    publish(path, 3)
+    reader = ArtifactReader(path)
+    publish(path, 5)
+    publish(path, 7)
+    assert reader.manifest['size'] == 3
+    np.testing.assert_array_equal(reader.array('values'), np.arange(3))
+    assert reader.json('info') == {'size': 3}
+    assert ArtifactReader(path).manifest['size'] == 7
+
+
+def test_publish_while_reader_resolves_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'artifact')
+    publish(path, 3)
+    realpath = os.path.realpath
+
+    def resolve_then_publish(target):
+        # A publish landing right after the reader resolved the symlink
+        resolved = realpath(target)
+        monkeypatch.setattr(artifact.os.path, 'realpath', realpath)
+        publish(path, 5)
+        return resolved
+
+    monkeypatch.setattr(artifact.os.path, 'realpath', resolve_then_publish)
+    reader = ArtifactReader(path)
+    assert reader.manifest['size'] == 3
+    np.testing.assert_array_equal(reader.array('values'), np.arange(3))
+    assert ArtifactReader(path).manifest['size'] == 5
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+import cache
+from cache import RankingCache
+from model import ProductRecommender
+from reloader import ModelReloader
+from scoring_pool import ScoringPool
+from synthetic import synthetic_catalog
+
+PREFERENCES = {'interests': 'hiking gaming', 'gender': 'male'}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    return clock
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    ranking_cache = RankingCache(max_entries=2, ttl_seconds=60)
+    ranking_cache.put('a', 1)
+    ranking_cache.put('b', 2)
+    assert ranking_cache.get('a') == 1
+    ranking_cache.put('c', 3)
+    assert ranking_cache.get('b') is None
+    assert ranking_cache.get('a') == 1
+    assert ranking_cache.get('c') == 3
+    assert ranking_cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    ranking_cache = RankingCache(max_entries=2, ttl_seconds=60)
+    ranking_cache.put('a', 1)
+    clock.now += 59
+    assert ranking_cache.get('a') == 1
+    clock.now += 2
+    assert ranking_cache.get('a') is None
+    assert len(ranking_cache) == 0
+    stats = ranking_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations']) == (1, 1, 1)
+
+
+def test_rejected_entry_counts_as_miss(clock):
+    ranking_cache = RankingCache()
+    ranking_cache.put('a', 1)
+    assert ranking_cache.get('a', accept=lambda value: value > 1) is None
+    assert ranking_cache.get('a') == 1
+    assert ranking_cache.stats()['misses'] == 1
+
+
+def test_zero_capacity_caches_nothing():
+    ranking_cache = RankingCache(max_entries=0)
+    ranking_cache.put('a', 1)
+    assert ranking_cache.get('a') is None
+
+
+def trained(seed):
+    model = ProductRecommender()
+    model.train(synthetic_catalog(300, seed=seed), {}, None)
+    return model
+
+
+def test_retraining_clears_rankings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    model = trained(1)
+    model.get_recommendations(None, PREFERENCES, 6)
+    assert len(model.ranking_cache) == 1
+    model.train(synthetic_catalog(300, seed=2), {}, None)
+    assert len(model.ranking_cache) == 0
+
+
+def test_model_swap_starts_with_empty_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    models = [trained(1), trained(2)]
+    reloader = ModelReloader(
+        lambda products: models.pop(0), lambda model: ScoringPool(model, mode='inline'),
+        artifact_path=str(tmp_path / 'artifact'),
+    )
+
+    async def swap():
+        first = await reloader.reload()
+        await first.pool.run('get_recommendation_page', PREFERENCES, 1, 6, None)
+        assert len(first.model.ranking_cache) == 1
+        second = await reloader.reload()
+        assert reloader.current is second and second.model is not first.model
+        assert len(second.model.ranking_cache) == 0
+        await reloader.stop()
+
+    asyncio.run(swap())
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import httpx
+
+from data_fetcher import AsyncDataFetcher
+from model import ProductRecommender
+
+PRODUCTS = [
+    {'id': 1, 'title': 'Hiking boots', 'description': 'Boots', 'price': 80, 'category': 'Outdoors', 'image': ''},
+    {'id': 2, 'title': 'Desk lamp', 'description': 'Lamp', 'price': 20, 'category': 'Home', 'image': ''},
+]
+
+
+class Upstream:
+    """Catalog API stub answering conditional requests like a real server."""
+
+    def __init__(self, products, etag='"v1"'):
+        self.products = products
+        self.etag = etag
+        self.failure = None
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.failure == 'timeout':
+            raise httpx.ReadTimeout('upstream timed out', request=request)
+        if self.failure is not None:
+            return httpx.Response(self.failure, request=request)
+        if request.headers.get('If-None-Match') == self.etag:
+            return httpx.Response(304, headers={'ETag': self.etag}, request=request)
+        return httpx.Response(200, json=self.products, headers={'ETag': self.etag}, request=request)
+
+
+def fetch(upstream, snapshot_dir, refreshes=1):
+    """Start a fetcher, force ``refreshes`` refreshes and return it stopped."""
+    async def run():
+        fetcher = AsyncDataFetcher(
+            'http://catalog.test/products', str(snapshot_dir),
+            refresh_interval=3600, retry_interval=3600, transport=httpx.MockTransport(upstream),
+        )
+        await fetcher.start()
+        for _ in range(refreshes):
+            await fetcher.refresh(force=True)
+        await fetcher.stop()
+        return fetcher
+    return asyncio.run(run())
+
+
+def test_not_modified_keeps_snapshot_and_etag(tmp_path):
+    upstream = Upstream(PRODUCTS)
+    version = fetch(upstream, tmp_path).catalog_version
+    upstream.requests.clear()
+    fetcher = fetch(upstream, tmp_path)
+    assert [r.headers.get('If-None-Match') for r in upstream.requests] == ['"v1"']
+    assert fetcher.catalog_version == version
+    assert fetcher._snapshot.etag == '"v1"'
+    assert [p['id'] for p in fetcher.get_products()] == [1, 2]
+
+
+def test_upstream_failures_serve_stale_snapshot(tmp_path):
+    upstream = Upstream(PRODUCTS)
+    version = fetch(upstream, tmp_path).catalog_version
+    for failure in (503, 500, 'timeout'):
+        upstream.failure = failure
+        fetcher = fetch(upstream, tmp_path)
+        assert fetcher.catalog_version == version
+        assert [p['id'] for p in fetcher.get_products()] == [1, 2]
+
+
+def test_snapshot_survives_restart(tmp_path):
+    fetched = fetch(Upstream(PRODUCTS), tmp_path)
+    # No refresh is due after the restart, and the upstream is down anyway
+    upstream = Upstream(PRODUCTS)
+    upstream.failure = 503
+    restarted = fetch(upstream, tmp_path, refreshes=0)
+    assert upstream.requests == []
+    assert restarted.catalog_version == fetched.catalog_version
+    assert restarted.get_products() == fetched.get_products()
+    assert restarted._snapshot.etag == '"v1"'
+    with open(tmp_path / 'snapshot.json') as f:
+        assert json.load(f)['version'] == fetched.catalog_version
+
+
+def test_changed_body_bumps_catalog_version(tmp_path):
+    upstream = Upstream(PRODUCTS)
+    version = fetch(upstream, tmp_path).catalog_version
+    upstream.products = PRODUCTS + [dict(PRODUCTS[0], id=3, title='Camping tent')]
+    upstream.etag = '"v2"'
+    fetcher = fetch(upstream, tmp_path)
+    assert fetcher.catalog_version != version
+    assert [p['id'] for p in fetcher.get_products()] == [1, 2, 3]
+    assert fetcher._snapshot.etag == '"v2"'
+
+
+def test_fetched_version_matches_model_trained_on_it(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fetcher = fetch(Upstream(PRODUCTS), tmp_path / 'catalog')
+    model = ProductRecommender()
+    model.train(fetcher.get_products(), {}, str(tmp_path / 'artifact'))
+    assert model.catalog_version == fetcher.catalog_version
+    assert ProductRecommender.load(str(tmp_path / 'artifact')).catalog_version == fetcher.catalog_version
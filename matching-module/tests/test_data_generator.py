@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from data_generator import generate_production_data, interleave
+
+
+@pytest.mark.parametrize('engine, output', [('python', 'profiles.json'), ('numpy', 'profiles.jsonl.gz')])
+def test_sharded_output_does_not_depend_on_worker_count(tmp_path, engine, output):
+    contents = []
+    for workers in (1, 3):
+        path = tmp_path / str(workers) / output
+        generate_production_data(3000, str(path), seed=7, workers=workers, engine=engine)
+        contents.append(path.read_bytes())
+    assert contents[0] == contents[1]
+
+
+def test_seed_changes_output(tmp_path):
+    paths = [tmp_path / f'{seed}.jsonl' for seed in (1, 2)]
+    for seed, path in zip((1, 2), paths):
+        generate_production_data(500, str(path), seed=seed, workers=1)
+    assert paths[0].read_bytes() != paths[1].read_bytes()
+
+
+def linear_interleave(counts, rng):
+    """The straightforward scan interleave() must agree with."""
+    keys = list(counts)
+    remaining = [counts[key] for key in keys]
+    total = sum(remaining)
+    while total:
+        position = rng.randrange(total)
+        for index, count in enumerate(remaining):
+            if position < count:
+                break
+            position -= count
+        remaining[index] -= 1
+        total -= 1
+        yield keys[index]
+
+
+@pytest.mark.parametrize('counts', [
+    {},
+    {'only': 5},
+    {'a': 3, 'b': 0, 'c': 7},
+    {key: (key * 37) % 11 for key in range(64)},
+    {key: 1 + key % 5 for key in range(100)},
+])
+def test_interleave_matches_linear_scan(counts):
+    expected = list(linear_interleave(counts, random.Random(4)))
+    assert list(interleave(counts, random.Random(4))) == expected
+    assert sorted(expected) == sorted(key for key, count in counts.items() for _ in range(count))
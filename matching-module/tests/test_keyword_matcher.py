@@ -0,0 +1,42 @@
+import random
+
+from keyword_matcher import KeywordMatcher
+
+KEYWORDS = ['men', 'women', 'womens', 'he', 'she', 'her', 'hers', 'ssd', 'ss', 'a', 'gaming', 'game']
+
+
+def random_texts(count, seed=0):
+    rng = random.Random(seed)
+    alphabet = 'aeghimnorsdw '
+    return [''.join(rng.choice(alphabet) for _ in range(rng.randrange(0, 60))) for _ in range(count)]
+
+
+def test_find_matches_substring_semantics():
+    matcher = KeywordMatcher(KEYWORDS)
+    for text in random_texts(500) + ["women's clothing", 'gaming ssd', 'she sells her hers', '']:
+        assert matcher.find(text) == {keyword for keyword in KEYWORDS if keyword in text}
+
+
+def test_iter_matches_reports_every_occurrence():
+    matcher = KeywordMatcher(KEYWORDS)
+    for text in random_texts(200, seed=1):
+        expected = sorted(
+            (start + len(keyword), keyword)
+            for keyword in KEYWORDS
+            for start in range(len(text))
+            if text.startswith(keyword, start)
+        )
+        assert sorted(matcher.iter_matches(text)) == expected
+
+
+def test_bytes_match_like_text():
+    matcher = KeywordMatcher(keyword.encode('utf-8') for keyword in KEYWORDS + ['café'])
+    text = "women's café gaming"
+    found = matcher.find(memoryview(text.encode('utf-8')))
+    assert {keyword.decode('utf-8') for keyword in found} == {
+        keyword for keyword in KEYWORDS + ['café'] if keyword in text
+    }
+
+
+def test_empty_keywords_are_ignored():
+    assert KeywordMatcher(['', 'men']).find('women') == {'men'}
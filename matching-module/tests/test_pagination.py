@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from pagination import InvalidCursorError, decode_cursor, encode_cursor, top_k
+
+PREFERENCES = {'interests': 'hiking gaming photography', 'gender': 'male'}
+
+
+def test_top_k_matches_stable_sort():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 5, size=1000).astype(float)
+    expected = np.argsort(-scores, kind='stable')
+    for k in (0, 1, 7, 100, 999, 1000, 2000):
+        np.testing.assert_array_equal(top_k(scores, k), expected[:k])
+
+
+def test_cursor_round_trip():
+    state = {'p': 'abc123', 'o': 42}
+    assert decode_cursor(encode_cursor(state)) == state
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(InvalidCursorError):
+        decode_cursor('not a cursor')
+
+
+def test_cursor_pages_continue_the_ranking(model):
+    model.ranking_cache.clear()
+    ranking = [r['id'] for r in model.get_recommendation_page(PREFERENCES, 1, 500)[0]]
+
+    model.ranking_cache.clear()
+    seen = []
+    page, cursor = model.get_recommendation_page(PREFERENCES, 1, 35)
+    seen += [r['id'] for r in page]
+    while cursor and len(seen) < 400:
+        page, cursor = model.get_recommendation_page(PREFERENCES, 1, 35, cursor)
+        seen += [r['id'] for r in page]
+    assert seen == ranking[:len(seen)]
+
+
+def test_foreign_cursor_is_rejected(model):
+    _, cursor = model.get_recommendation_page(PREFERENCES, 1, 6)
+    with pytest.raises(InvalidCursorError):
+        model.get_recommendation_page({'interests': 'yoga'}, 1, 6, cursor)
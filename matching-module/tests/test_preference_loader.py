@@ -0,0 +1,86 @@
+import gzip
+import json
+
+import pytest
+
+import preference_loader
+from preference_loader import READ_CHUNK_SIZE, batched, iter_preferences, sample_preferences
+
+
+def profiles(count):
+    return [{'interests': f'hiking {i} ünïcode', 'gender': 'female' if i % 2 else 'male'} for i in range(count)]
+
+
+def write(path, records, layout):
+    if layout == 'array':
+        text = '  [\n' + ',\n'.join(json.dumps(record) for record in records) + '\n]\n'
+    else:
+        text = '\n'.join(json.dumps(record) for record in records) + '\n'
+    if path.endswith('.gz'):
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return text
+
+
+@pytest.mark.parametrize('layout, name', [
+    ('array', 'prefs.json'), ('lines', 'prefs.jsonl'),
+    ('array', 'prefs.json.gz'), ('lines', 'prefs.jsonl.gz'),
+])
+def test_detects_layout_and_compression(tmp_path, layout, name):
+    records = profiles(50)
+    path = str(tmp_path / name)
+    write(path, records, layout)
+    assert list(iter_preferences(path)) == records
+
+
+@pytest.mark.parametrize('layout', ['array', 'lines'])
+def test_record_straddling_chunk_boundary(tmp_path, layout):
+    records = profiles(3)
+    # Long enough to cross the first read boundary on its own
+    records.insert(1, {'interests': 'x' * READ_CHUNK_SIZE, 'gender': 'male'})
+    path = str(tmp_path / 'prefs.json')
+    text = write(path, records, layout)
+    first = text.index('x' * 10)
+    assert first < READ_CHUNK_SIZE < first + READ_CHUNK_SIZE
+    assert list(iter_preferences(path)) == records
+
+
+@pytest.mark.parametrize('layout', ['array', 'lines'])
+def test_small_chunks_split_every_record(tmp_path, monkeypatch, layout):
+    monkeypatch.setattr(preference_loader, 'READ_CHUNK_SIZE', 7)
+    records = profiles(40)
+    path = str(tmp_path / 'prefs.json')
+    write(path, records, layout)
+    assert list(iter_preferences(path)) == records
+
+
+def test_lines_without_trailing_newline(tmp_path):
+    path = tmp_path / 'prefs.jsonl'
+    path.write_text('{"a": 1}\n\n{"a": 2}', encoding='utf-8')
+    assert list(iter_preferences(str(path))) == [{'a': 1}, {'a': 2}]
+
+
+def test_empty_array(tmp_path):
+    path = tmp_path / 'prefs.json'
+    path.write_text(' [ ] ', encoding='utf-8')
+    assert list(iter_preferences(str(path))) == []
+
+
+def test_reservoir_sample_is_deterministic(tmp_path):
+    records = profiles(500)
+    path = str(tmp_path / 'prefs.jsonl.gz')
+    write(path, records, 'lines')
+    sample = sample_preferences(path, 20, seed=3)
+    assert len(sample) == 20
+    assert sample == sample_preferences(path, 20, seed=3)
+    assert sample != sample_preferences(path, 20, seed=4)
+    assert all(record in records for record in sample)
+    assert sample_preferences(path, 1000, seed=3) == records
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched([], 2)) == []
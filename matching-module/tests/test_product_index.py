@@ -0,0 +1,27 @@
+import random
+
+import numpy as np
+
+from product_index import ProductIndex
+from synthetic import synthetic_catalog
+
+
+def test_resolve_terms_matches_substring_search():
+    products = synthetic_catalog(500, seed=2) + [
+        # Terms that also occur across the boundary of adjacent vocabulary tokens
+        {'id': 'x', 'title': 'abab aba ba', 'description': 'aaa aa', 'category': 'zz'},
+    ]
+    index = ProductIndex(products)
+    texts = [
+        f"{p.get('title', '')} {p.get('description', '')} {p.get('category', '')}".lower()
+        for p in products
+    ]
+    vocabulary = list(index.vocabulary)
+    rng = random.Random(0)
+    terms = ['aba', 'aa', 'bab', 'a', 'zz', 'nomatch', '']
+    terms += [token[i:i + n] for token in rng.sample(vocabulary, 200)
+              for i, n in [(rng.randrange(len(token)), rng.randrange(1, 6))]]
+    resolved = index.resolve_terms(terms)
+    for term in terms:
+        expected = [i for i, text in enumerate(texts) if term and term in text]
+        np.testing.assert_array_equal(resolved[term], expected, err_msg=term)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import main
+from artifact import artifact_lock
+from data_generator import ProductionPreferenceGenerator
+from model import ProductRecommender
+from synthetic import synthetic_catalog
+
+
+@pytest.fixture
+def artifact_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / 'models' / 'artifact')
+    monkeypatch.setenv('MODEL_ARTIFACT_DIR', path)
+    return path
+
+
+def corpus():
+    return ProductionPreferenceGenerator(seed=5).generate_production_preferences(2000)
+
+
+def test_catalog_change_keeps_corpus_affinities(artifact_path):
+    trained = ProductRecommender()
+    trained.train(synthetic_catalog(400, seed=1), iter(corpus()), None)
+    with artifact_lock(artifact_path):
+        trained.save(artifact_path)
+
+    catalog = synthetic_catalog(500, seed=2)
+    rebuilt = main.initialize_model(catalog)
+    assert rebuilt.corpus_trained
+    assert rebuilt.training_profiles == 2000
+
+    retrained = ProductRecommender()
+    retrained.train(catalog, iter(corpus()), None)
+    assert list(rebuilt.affinity_table.terms) == list(retrained.affinity_table.terms)
+    for name in ('indptr', 'products', 'weights'):
+        np.testing.assert_array_equal(
+            getattr(rebuilt.affinity_table, name), getattr(retrained.affinity_table, name)
+        )
+
+
+def test_catalog_change_without_corpus_retrains_placeholder(artifact_path, capsys):
+    main.build_model(artifact_path, synthetic_catalog(400, seed=1))
+    previous = ProductRecommender.load(artifact_path)
+    assert not previous.corpus_trained
+
+    rebuilt = main.initialize_model(synthetic_catalog(500, seed=2))
+    assert not rebuilt.corpus_trained
+    assert rebuilt.training_profiles == 1
+    assert 'Keeping affinities' not in capsys.readouterr().out
@@ -0,0 +1,31 @@
+import numpy as np
+
+
+def test_vectorized_scores_match_python_loop(model, profiles):
+    analyzed = [model._analyze_user_profile(preferences) for preferences in profiles]
+    vectorized = model._score_products_batch(analyzed)
+    python = np.vstack([model._score_products_loop(profile) for profile in analyzed])
+    np.testing.assert_allclose(vectorized, python, rtol=0, atol=1e-12)
+
+
+def test_vectorized_scores_match_python_loop_on_a_subset(model, profiles):
+    positions = np.sort(np.random.default_rng(0).choice(len(model.product_index), 300, replace=False))
+    analyzed = [model._analyze_user_profile(preferences) for preferences in profiles[:10]]
+    subset = model._score_products_batch(analyzed, positions)
+    np.testing.assert_array_equal(subset, model._score_products_batch(analyzed)[:, positions])
+    python = np.vstack([model._score_products_loop(profile, positions) for profile in analyzed])
+    np.testing.assert_allclose(subset, python, rtol=0, atol=1e-12)
+
+
+def test_recommendations_do_not_depend_on_scoring_mode(model, profiles):
+    try:
+        for preferences in profiles[:10]:
+            model.scoring_mode = 'vectorized'
+            model.ranking_cache.clear()
+            vectorized = model.get_recommendations(None, preferences, 12)
+            model.scoring_mode = 'python'
+            model.ranking_cache.clear()
+            assert model.get_recommendations(None, preferences, 12) == vectorized
+    finally:
+        model.scoring_mode = 'vectorized'
+        model.ranking_cache.clear()
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import router
+from scoring_pool import PoolSaturatedError, ScoringPool
+
+
+class BlockingModel:
+    """Stands in for the recommender; calls wait until ``release`` is set."""
+
+    def __init__(self):
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+
+    def get_recommendation_page(self, preferences, page, page_size, cursor):
+        self.started.release()
+        assert self.release.wait(10)
+        return [], None
+
+
+class Serving:
+    def __init__(self, pool):
+        self.pool = pool
+        self.model_version = 'test'
+        self.catalog_version = 'test'
+
+
+class Fetcher:
+    def get_products(self):
+        return [{'id': 1, 'title': 'Desk lamp'}]
+
+
+def occupy(pool, model, calls):
+    """Start ``calls`` blocked scoring calls on background threads."""
+    threads = [
+        threading.Thread(target=asyncio.run, args=(pool.run('get_recommendation_page', {}, 1, 6, None),))
+        for _ in range(calls)
+    ]
+    for thread in threads:
+        thread.start()
+    for _ in range(min(calls, pool.max_workers)):
+        assert model.started.acquire(timeout=10)
+    return threads
+
+
+def client_for(pool):
+    app = FastAPI()
+    app.include_router(router)
+    app.state.reloader = type('Reloader', (), {'current': Serving(pool)})()
+    app.state.data_fetcher = Fetcher()
+    return TestClient(app)
+
+
+def test_full_backlog_is_rejected():
+    model = BlockingModel()
+    pool = ScoringPool(model, mode='thread', max_workers=1, max_pending=2)
+    threads = occupy(pool, model, 2)
+    try:
+        assert pool.pending == 2
+        with pytest.raises(PoolSaturatedError):
+            asyncio.run(pool.run('get_recommendation_page', {}, 1, 6, None))
+    finally:
+        model.release.set()
+        for thread in threads:
+            thread.join()
+        pool.shutdown()
+    assert pool.pending == 0
+
+
+def test_saturated_pool_answers_503():
+    model = BlockingModel()
+    pool = ScoringPool(model, mode='thread', max_workers=1, max_pending=1)
+    threads = occupy(pool, model, 1)
+    try:
+        response = client_for(pool).post('/match-products', json={'interests': 'lamps'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+    finally:
+        model.release.set()
+        for thread in threads:
+            thread.join()
+        pool.shutdown()
+
+
+@pytest.mark.parametrize('mode', ['inline', 'thread'])
+def test_shut_down_pool_answers_503(mode):
+    model = BlockingModel()
+    model.release.set()
+    pool = ScoringPool(model, mode=mode, max_workers=1)
+    assert asyncio.run(pool.run('get_recommendation_page', {}, 1, 6, None)) == ([], None)
+    pool.shutdown()
+    with pytest.raises(PoolSaturatedError):
+        asyncio.run(pool.run('get_recommendation_page', {}, 1, 6, None))
+    assert client_for(pool).post('/match-products', json={'interests': 'lamps'}).status_code == 503
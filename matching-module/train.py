@@ -1,30 +1,45 @@
+import argparse
 import logging
+import os
+from artifact import DEFAULT_ARTIFACT_DIR, artifact_lock
 from data_fetcher import DataFetcher
 from model import ProductRecommender
-import json
+from preference_loader import iter_preferences, log_progress
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def train_model():
+def train_model(preferences_path='data/production_preferences.json', artifact_path=DEFAULT_ARTIFACT_DIR):
     # Fetch products
     logger.info("Fetching products...")
     data_fetcher = DataFetcher()
     products = data_fetcher.get_products()
     
-    # Load training preferences
-    logger.info("Loading training preferences...")
-    with open('data/production_preferences.json', 'r') as f:
-        preferences = json.load(f)
-    logger.info(f"Loaded {len(preferences)} training preference profiles")
+    # Stream training preferences; JSON Lines and JSON arrays, optionally
+    # gzipped, are read incrementally so memory does not grow with the corpus
+    logger.info(f"Streaming training preferences from {preferences_path}...")
+    preferences = log_progress(iter_preferences(preferences_path))
     
     # Train model
     logger.info("Training model with expanded dataset...")
     recommender = ProductRecommender()
-    recommender.train(products, preferences)
+    recommender.train(products, preferences, artifact_path=None)
     
-    # Save sample preferences for testing
-    logger.info("Saved sample preferences for testing")
+    # Publish under the lock the server builds under, so a worker starting
+    # meanwhile cannot replace this model with one trained on a fallback
+    # profile; the lock is only held while saving
+    with artifact_lock(artifact_path):
+        recommender.save(artifact_path)
+    logger.info(
+        f"Trained on {recommender.training_profiles} preference profiles; "
+        f"learned affinities for {len(recommender.affinity_table)} interest terms"
+    )
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the recommendation model")
+    parser.add_argument('--preferences', default='data/production_preferences.json',
+                        help="training preferences (.json or .jsonl, optionally .gz)")
+    parser.add_argument('--artifact', default=os.environ.get('MODEL_ARTIFACT_DIR', DEFAULT_ARTIFACT_DIR),
+                        help="model artifact to publish, as served by main.py")
+    args = parser.parse_args()
+    train_model(args.preferences, args.artifact)